@@ -26,6 +26,13 @@ class Settings(BaseSettings):
     redis_url: str = "redis://localhost:6379/0"
     redis_enabled: bool = False  # Set to True when Redis is available
 
+    # QR login debugging - write step screenshots to /tmp
+    debug_qr: bool = False
+
+    # Optional persistent Chromium profile for QR login; when set, repeat
+    # sessions reuse the on-disk HTTP cache instead of cold-loading Douyin
+    playwright_user_data_dir: Optional[str] = None
+
     # Douyin API
     douyin_cookie: str = ""
     douyin_user_agent: str = (
@@ -4,6 +4,8 @@ Handles all HTTP requests to Douyin's APIs.
 """
 import httpx
 import asyncio
+import random
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from urllib.parse import urlencode
 from loguru import logger
@@ -46,6 +48,12 @@ class DouyinEndpoints:
     HOT_VIDEO = f"{API_BASE}/hot/search/video/list/"
 
 
+# Upper bound on honoring a 429 Retry-After: the crawler is awaited
+# straight from request handlers, so an hour-long server hint must not
+# park an HTTP request for an hour
+RETRY_AFTER_CAP_S = 15.0
+
+
 class DouyinCrawler:
     """
     Async crawler for Douyin API.
@@ -59,6 +67,9 @@ class DouyinCrawler:
         self.max_retries = settings.max_retries
         self.retry_delay = settings.retry_delay
         self.signature = SignatureManager(self.user_agent)
+        # One pooled client for the crawler's lifetime; per-request clients
+        # would pay TCP+TLS setup on every API call
+        self.client = httpx.AsyncClient(timeout=self.timeout)
 
         self.headers = {
             "User-Agent": self.user_agent,
@@ -125,29 +136,39 @@ class DouyinCrawler:
 
         full_params = self._build_params(params)
 
+        retry_after = 0.0
         for attempt in range(self.max_retries):
             try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    if sign:
-                        query_string = urlencode(full_params)
-                        signed_params, xbogus, _ = self.signature.xbogus.get_xbogus(query_string)
-                        full_url = f"{url}?{signed_params}"
-                    else:
-                        full_url = f"{url}?{urlencode(full_params)}"
-
-                    if method.upper() == "GET":
-                        response = await client.get(full_url, headers=self.headers)
-                    else:
-                        response = await client.post(
-                            full_url,
-                            headers=self.headers,
-                            json=data
-                        )
-
-                    if response.status_code == 200:
-                        return response.json()
-                    else:
-                        logger.warning(f"Request failed with status {response.status_code}")
+                if sign:
+                    query_string = urlencode(full_params)
+                    signed_params, xbogus, _ = self.signature.xbogus.get_xbogus(query_string)
+                    full_url = f"{url}?{signed_params}"
+                else:
+                    full_url = f"{url}?{urlencode(full_params)}"
+
+                if method.upper() == "GET":
+                    response = await self.client.get(full_url, headers=self.headers)
+                else:
+                    response = await self.client.post(
+                        full_url,
+                        headers=self.headers,
+                        json=data
+                    )
+
+                if response.status_code == 200:
+                    return response.json()
+                else:
+                    logger.warning(f"Request failed with status {response.status_code}")
+                    if response.status_code == 429:
+                        # Honor the server's pacing hint when rate limited,
+                        # clamped so a huge hint can't stall the caller
+                        try:
+                            retry_after = min(
+                                float(response.headers.get("Retry-After", 0)),
+                                RETRY_AFTER_CAP_S,
+                            )
+                        except ValueError:
+                            retry_after = 0.0
 
             except httpx.TimeoutException:
                 logger.warning(f"Request timeout (attempt {attempt + 1}/{self.max_retries})")
@@ -157,10 +178,19 @@ class DouyinCrawler:
                 logger.error(f"Unexpected error: {e}")
 
             if attempt < self.max_retries - 1:
-                await asyncio.sleep(self.retry_delay * (attempt + 1))
+                # Exponential backoff with jitter so concurrent batch
+                # requests don't retry in lockstep
+                delay = self.retry_delay * (2 ** attempt)
+                delay += random.uniform(0, delay)
+                await asyncio.sleep(max(delay, retry_after))
+                retry_after = 0.0
 
         return None
 
+    async def aclose(self):
+        """Close the underlying HTTP client."""
+        await self.client.aclose()
+
     # User methods
     async def get_user_profile(self, sec_uid: str) -> Optional[Dict[str, Any]]:
         """Get user profile by sec_uid."""
@@ -622,3 +652,9 @@ class DouyinCrawler:
             "collect_count": statistics.get("collect_count", 0),
             "create_time": item.get("create_time"),
         }
+
+
+@lru_cache(maxsize=1)
+def get_crawler() -> DouyinCrawler:
+    """Process-wide crawler instance sharing one pooled HTTP client."""
+    return DouyinCrawler()
@@ -4,6 +4,7 @@ Douyin Analytics Platform - FastAPI Application Entry Point
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from loguru import logger
 import sys
 
@@ -30,11 +31,20 @@ async def lifespan(app: FastAPI):
     logger.info(f"Starting {settings.app_name} v{settings.app_version}")
     await init_db()
     logger.info("Database initialized")
+    # Launch the shared QR-login browser now so the first login request
+    # doesn't pay the Chromium cold start
+    from app.services.qrcode_login import warmup_browser
+    await warmup_browser()
 
     yield
 
     # Shutdown
     logger.info("Shutting down application")
+    from app.services.qrcode_login import shutdown_browser
+    await shutdown_browser()
+    # Close the shared crawler's pooled HTTP connections
+    from app.core.crawler import get_crawler
+    await get_crawler().aclose()
     await close_db()
     logger.info("Database connection closed")
 
@@ -47,6 +57,9 @@ app = FastAPI(
     lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redoc",
+    # orjson encodes large payloads (history snapshots, rankings) at C
+    # speed and handles datetime natively
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -2,7 +2,7 @@
 Task and analysis database models.
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Boolean, Text, DateTime, JSON, Index
 
 from app.db.database import Base
 
@@ -22,6 +22,12 @@ class MonitorTask(Base):
     config = Column(JSON)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Covers the task-list query: filter on is_active/task_type, newest first
+    __table_args__ = (
+        Index("ix_monitor_task_active_type_created",
+              "is_active", "task_type", created_at.desc()),
+    )
+
 
 class AnalysisResult(Base):
     """Analysis result model."""
@@ -45,3 +51,8 @@ class TaskLog(Base):
     message = Column(Text)
     data = Column(JSON)
     timestamp = Column(DateTime, default=datetime.utcnow)
+
+    # Covers the per-task log page: task_id filter ordered by newest first
+    __table_args__ = (
+        Index("ix_task_log_taskid_ts", "task_id", timestamp.desc()),
+    )
@@ -1,6 +1,7 @@
 """
 Analysis service for deep data analysis.
 """
+import asyncio
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -10,27 +11,30 @@ from app.models.task import AnalysisResult
 from app.services.user_service import UserService
 from app.services.video_service import VideoService
 from app.services.comment_service import CommentService
-from app.core.crawler import DouyinCrawler
+from app.core.crawler import get_crawler
 
 
 class AnalysisService:
     """Service for data analysis operations."""
 
     def __init__(self):
-        self.crawler = DouyinCrawler()
+        self.crawler = get_crawler()
         self.user_service = UserService()
         self.video_service = VideoService()
         self.comment_service = CommentService()
 
     async def analyze_user(self, sec_uid: str, db: AsyncSession) -> dict:
         """Deep analysis of a user."""
-        # Get user profile
-        profile = await self.user_service.get_user_profile(sec_uid, db)
-        if not profile:
+        # Profile and posts are independent network calls - overlap them
+        profile, posts_data = await asyncio.gather(
+            self.user_service.get_user_profile(sec_uid, db),
+            self.crawler.get_user_posts(sec_uid, 0, 50),
+            return_exceptions=True
+        )
+        if isinstance(profile, Exception) or not profile:
             return {"error": "User not found"}
-
-        # Get user posts
-        posts_data = await self.crawler.get_user_posts(sec_uid, 0, 50)
+        if isinstance(posts_data, Exception):
+            posts_data = None
         posts = posts_data.get("videos", []) if posts_data else []
 
         # Calculate metrics
@@ -4,14 +4,21 @@ Comment-related business logic service.
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
-from app.core.crawler import DouyinCrawler
+from app.core.crawler import get_crawler
+
+# Pre-encoded once; bytes containment dispatches to C memmem, which beats
+# per-word str scans over wide-unicode comment text.
+POSITIVE_WORDS = [w.encode("utf-8") for w in
+                  ["好", "棒", "赞", "喜欢", "爱", "厉害", "优秀", "漂亮", "帅", "美"]]
+NEGATIVE_WORDS = [w.encode("utf-8") for w in
+                  ["差", "烂", "垃圾", "讨厌", "无聊", "假", "骗", "坑"]]
 
 
 class CommentService:
     """Service for comment-related operations."""
 
     def __init__(self):
-        self.crawler = DouyinCrawler()
+        self.crawler = get_crawler()
 
     async def get_comments_by_video(self, aweme_id: str, cursor: int, count: int, db: AsyncSession) -> dict:
         """Get comments for a video."""
@@ -43,13 +50,10 @@ class CommentService:
         negative_count = 0
         neutral_count = 0
 
-        positive_words = ["好", "棒", "赞", "喜欢", "爱", "厉害", "优秀", "漂亮", "帅", "美"]
-        negative_words = ["差", "烂", "垃圾", "讨厌", "无聊", "假", "骗", "坑"]
-
         for comment in all_comments:
-            content = comment.get("content", "")
-            has_positive = any(word in content for word in positive_words)
-            has_negative = any(word in content for word in negative_words)
+            content = comment.get("content", "").encode("utf-8")
+            has_positive = any(word in content for word in POSITIVE_WORDS)
+            has_negative = any(word in content for word in NEGATIVE_WORDS)
 
             if has_positive and not has_negative:
                 positive_count += 1
@@ -4,35 +4,34 @@ Live streaming related business logic service.
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from loguru import logger
 
 from app.models.live import Live, LiveDanmaku
-from app.core.crawler import DouyinCrawler
+from app.core.crawler import get_crawler
 
 
 class LiveService:
     """Service for live streaming operations."""
 
     def __init__(self):
-        self.crawler = DouyinCrawler()
+        self.crawler = get_crawler()
 
     async def get_live_info(self, room_id: str, db: AsyncSession) -> Optional[dict]:
         """Get live room information."""
         try:
             data = await self.crawler.get_live_info(room_id)
             if data:
-                # Save to database
-                result = await db.execute(select(Live).where(Live.room_id == room_id))
-                live = result.scalar_one_or_none()
-
-                if live:
-                    for key, value in data.items():
-                        if hasattr(live, key):
-                            setattr(live, key, value)
-                else:
-                    live = Live(**data)
-                    db.add(live)
-                await db.flush()
+                # Save to database with a single upsert instead of
+                # SELECT + per-attribute setattr (each setattr goes through
+                # SQLAlchemy instrumentation)
+                values = {k: v for k, v in data.items() if k in Live.__table__.columns}
+                insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+                stmt = insert(Live).values(**values).on_conflict_do_update(
+                    index_elements=["room_id"], set_=values
+                )
+                await db.execute(stmt)
 
                 return data
         except Exception as e:
@@ -3,172 +3,635 @@ QR Code Login Service for Douyin using Playwright.
 Uses creator.douyin.com which has QR code login.
 """
 import asyncio
-import base64
 import os
 import random
+import re
+import tempfile
 import uuid
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+import time
 from typing import Optional, Dict, Any
 from pathlib import Path
 
 from loguru import logger
 
-login_sessions: Dict[str, Dict[str, Any]] = {}
-ESSENTIAL_COOKIES = ["sessionid", "sessionid_ss", "ttwid", "LOGIN_STATUS"]
+# SIMD base64 where available; falls back to the stdlib scalar encoder
+try:
+    from pybase64 import b64encode as _b64encode
+except ImportError:
+    from base64 import b64encode as _b64encode
+
+from app.config import settings
+
+
+@dataclass(slots=True)
+class LoginSession:
+    """Fixed-layout record for an active QR login session."""
+    status: str
+    qr_image: str
+    expires_at: float
+    service: "QRCodeLoginService"
+    playwright: Any = None
+    cookie: Optional[str] = None
+    error: Optional[str] = None
+    login_waiter: Optional[asyncio.Task] = None
+
+
+login_sessions: Dict[str, LoginSession] = {}
+
+# Resolved once; _save_cookie would otherwise rebuild the path per save
+ENV_PATH = Path(__file__).resolve().parents[2] / ".env"
+_COOKIE_LINE_RE = re.compile(r"^DOUYIN_COOKIE=.*$", re.MULTILINE)
+
+# One Playwright driver + Chromium process shared by all sessions; each
+# session gets its own (cheap) browser context. The browser is recycled
+# after a bounded number of sessions to keep leaked page state in check.
+_playwright = None
+_browser = None
+_browser_uses = 0
+_browser_lock = asyncio.Lock()
+
+MAX_BROWSER_USES = 50
+
+BROWSER_ARGS = (
+    "--no-sandbox", "--disable-setuid-sandbox", "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage", "--window-size=1920,1080"
+)
+
+
+async def _get_browser(use_headless: bool):
+    """Launch the shared Chromium on first use; relaunch if it died or is worn out."""
+    global _playwright, _browser, _browser_uses
+    async with _browser_lock:
+        if (
+            _browser is not None
+            and _browser.is_connected()
+            and _browser_uses >= MAX_BROWSER_USES
+            # A worn-out browser keeps serving while sessions still hold
+            # contexts on it; closing under them would kill their login
+            # waiters mid-scan. The recycle happens on the first checkout
+            # after the last context closes.
+            and not _browser.contexts
+        ):
+            await _browser.close()
+            _browser = None
+        if _browser is None or not _browser.is_connected():
+            from playwright.async_api import async_playwright
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(
+                headless=use_headless, args=list(BROWSER_ARGS)
+            )
+            _browser_uses = 0
+        _browser_uses += 1
+        return _browser
+
+
+_persistent_context = None
+
+
+def _on_persistent_context_close(_ctx):
+    global _persistent_context
+    _persistent_context = None
+
+
+def _client_hint_headers(chrome_ver: int) -> dict:
+    """Client-hint headers in agreement with the spoofed UA version;
+    Chromium would otherwise advertise its real one."""
+    return {
+        "sec-ch-ua": f'"Chromium";v="{chrome_ver}", "Google Chrome";v="{chrome_ver}", "Not?A_Brand";v="24"',
+        "sec-ch-ua-mobile": "?0",
+        "sec-ch-ua-platform": '"Windows"',
+    }
+
+
+async def _get_persistent_context(use_headless: bool, ua: str, chrome_ver: int):
+    """Open (or reuse) the context backed by the configured user-data-dir.
+
+    Chromium holds an exclusive singleton lock on a profile dir, so only
+    one live context can ever back it: concurrent sessions share this one
+    and own just their page. It is fully configured (UA, client hints,
+    stealth, resource routing) when first opened. Static Douyin assets
+    land in the profile's HTTP cache, so subsequent sessions skip most of
+    the cold network load; the profile dir survives context close.
+    """
+    global _playwright, _persistent_context
+    async with _browser_lock:
+        if _persistent_context is None:
+            if _playwright is None:
+                from playwright.async_api import async_playwright
+                _playwright = await async_playwright().start()
+            context = await _playwright.chromium.launch_persistent_context(
+                settings.playwright_user_data_dir,
+                headless=use_headless,
+                args=list(BROWSER_ARGS),
+                ignore_default_args=["--enable-automation"],
+                user_agent=ua, viewport={"width": 1920, "height": 1080},
+                locale="zh-CN", timezone_id="Asia/Shanghai",
+            )
+            await context.set_extra_http_headers(_client_hint_headers(chrome_ver))
+            await context.add_init_script(path=str(_STEALTH_PATH))
+            await context.route("**/*", _abort_heavy_resources)
+            context.on("close", _on_persistent_context_close)
+            _persistent_context = context
+        return _persistent_context
+
+
+_has_xvfb: Optional[bool] = None
+
+
+def _detect_xvfb() -> bool:
+    """Check /proc once for a running Xvfb instead of forking pgrep per login."""
+    global _has_xvfb
+    if _has_xvfb is None:
+        found = False
+        try:
+            for pid in os.listdir("/proc"):
+                if not pid.isdigit():
+                    continue
+                try:
+                    with open(f"/proc/{pid}/comm") as f:
+                        if f.read().strip() == "Xvfb":
+                            found = True
+                            break
+                except OSError:
+                    continue
+        except OSError:
+            pass
+        _has_xvfb = found
+    return _has_xvfb
+
+
+def _resolve_headless() -> bool:
+    """Decide headless mode consistently for warmup and login sessions.
+
+    Headful needs a display; with DISPLAY unset but Xvfb running, point
+    at it and stay headful so every launch — pre-warmed or per-session —
+    presents the same fingerprint.
+    """
+    use_headless = os.environ.get("DISPLAY") is None
+    if use_headless and _detect_xvfb():
+        os.environ["DISPLAY"] = ":99"
+        use_headless = False
+        logger.info("Detected Xvfb, setting DISPLAY=:99")
+    return use_headless
+
+
+_keepalive_task: Optional[asyncio.Task] = None
+KEEPALIVE_INTERVAL_S = 30
+
+
+async def warmup_browser():
+    """Pre-launch the shared browser so the first login doesn't pay the cold start."""
+    global _keepalive_task
+    try:
+        if settings.playwright_user_data_dir:
+            # Warm the launch path sessions actually use in persistent
+            # mode; the plain shared browser would sit idle
+            chrome_ver = random.randint(120, 130)
+            ua = f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/{chrome_ver}.0.0.0 Safari/537.36"
+            await _get_persistent_context(_resolve_headless(), ua, chrome_ver)
+        else:
+            await _get_browser(_resolve_headless())
+        logger.info("QR login browser pre-warmed")
+    except Exception as e:
+        logger.warning(f"Browser warmup failed: {e}")
+        return
+    if _keepalive_task is None or _keepalive_task.done():
+        _keepalive_task = asyncio.create_task(_keepalive())
+
+
+async def _keepalive():
+    """Relaunch the shared browser if its driver dies while idle.
+
+    Without this, a Chromium crash during a long idle stretch surfaces as
+    a slow (or failed) first login instead of being absorbed between
+    requests.
+    """
+    global _browser
+    while True:
+        await asyncio.sleep(KEEPALIVE_INTERVAL_S)
+        async with _browser_lock:
+            dead = _browser is not None and not _browser.is_connected()
+        if dead:
+            logger.warning("Shared browser disconnected, relaunching")
+            try:
+                await _get_browser(_resolve_headless())
+            except Exception as e:
+                logger.warning(f"Browser relaunch failed: {e}")
+
+
+async def shutdown_browser():
+    """Close the shared browser and driver on application shutdown."""
+    global _playwright, _browser, _browser_uses, _persistent_context
+    if _keepalive_task and not _keepalive_task.done():
+        _keepalive_task.cancel()
+    async with _browser_lock:
+        if _persistent_context is not None:
+            try:
+                await _persistent_context.close()
+            except Exception as e:
+                logger.warning(f"Persistent context shutdown error: {e}")
+            _persistent_context = None
+        if _browser is not None:
+            try:
+                await _browser.close()
+            except Exception as e:
+                logger.warning(f"Browser shutdown error: {e}")
+            _browser = None
+            _browser_uses = 0
+        if _playwright is not None:
+            try:
+                await _playwright.stop()
+            except Exception as e:
+                logger.warning(f"Playwright shutdown error: {e}")
+            _playwright = None
+
+
+SESSION_TTL_S = 300.0  # seconds
+SWEEP_INTERVAL_S = 30
+# Hard cap on concurrent sessions; each one pins a browser context and a
+# base64 QR image, so peak memory stays bounded even under poll storms
+MAX_SESSIONS = 64
+
+_sweeper_task: Optional[asyncio.Task] = None
+
+
+async def _evict_for_capacity():
+    """Make room before registering a new session.
+
+    Drops already-expired entries first, then the closest-to-expiry one
+    if the store is still at the cap.
+    """
+    now = time.monotonic()
+    expired = [sid for sid, s in login_sessions.items() if now > s.expires_at]
+    for sid in expired:
+        session = login_sessions.get(sid)
+        if session and session.service:
+            await session.service.cleanup_session(sid)
+    while len(login_sessions) >= MAX_SESSIONS:
+        oldest_sid = min(login_sessions, key=lambda sid: login_sessions[sid].expires_at)
+        logger.warning(f"Session cap reached, evicting {oldest_sid}")
+        session = login_sessions[oldest_sid]
+        if session.service:
+            await session.service.cleanup_session(oldest_sid)
+        else:
+            login_sessions.pop(oldest_sid, None)
+
+
+def _ensure_sweeper():
+    """Start the session reaper the first time a session is created."""
+    global _sweeper_task
+    if _sweeper_task is None or _sweeper_task.done():
+        _sweeper_task = asyncio.create_task(_sweep_sessions())
+
+
+async def _sweep_sessions():
+    """Evict abandoned sessions so they stop pinning browser contexts.
+
+    On-access expiry only fires when a client polls; a client that closed
+    its tab would otherwise leak its context until process restart.
+    cleanup_session pops the entry before tearing down, so a concurrent
+    poll hitting the same session is a no-op rather than a double close.
+    """
+    while login_sessions:
+        await asyncio.sleep(SWEEP_INTERVAL_S)
+        now = time.monotonic()
+        stale = [sid for sid, s in login_sessions.items()
+                 if now > s.expires_at]
+        for sid in stale:
+            logger.info(f"Sweeping abandoned login session {sid}")
+            session = login_sessions.get(sid)
+            if session and session.service:
+                await session.service.cleanup_session(sid)
+
+
+ESSENTIAL_COOKIES = frozenset({"sessionid", "sessionid_ss", "ttwid", "LOGIN_STATUS"})
+
+# In-page login predicate evaluated by the browser itself, so the server
+# does not have to poll cookies over CDP while waiting for the scan.
+LOGIN_DONE_JS = (
+    "() => (window.localStorage && window.localStorage.getItem('HasUserLogin') === '1')"
+    " || document.cookie.includes('LOGIN_STATUS=1')"
+    " || document.cookie.includes('sessionid=')"
+)
+LOGIN_WAIT_TIMEOUT_MS = 300_000  # matches the 5-minute session TTL
+
+# Locating labelled controls runs as a single XPath query evaluated in
+# native code - no JS loop over candidate elements, and textContent-based
+# matching never forces layout the way innerText would. The innermost
+# element carrying the label is selected via the descendant guard.
+# Labels are our own constants, so the string splice is safe.
+_LABELLED_CONTROL_XPATH_JS = """
+    const expr = "//*[self::button or self::a or self::div or self::span or @role='button']" +
+                 "[normalize-space(.)='" + text + "']" +
+                 "[not(descendant::*[normalize-space(.)='" + text + "'])]";
+    const res = document.evaluate(expr, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+"""
+
+# Waitable predicate: resolves the moment the labelled control renders
+# instead of sleeping a fixed number of seconds and hoping
+TEXT_VISIBLE_JS = """(text) => {""" + _LABELLED_CONTROL_XPATH_JS + """
+    for (let i = 0; i < res.snapshotLength; i++) {
+        if (res.snapshotItem(i).offsetParent !== null) return true;
+    }
+    return false;
+}"""
+
+# Click the visible control carrying exactly the given label;
+# offsetParent/offsetWidth filter out hidden duplicates
+CLICK_BY_TEXT_JS = """(text) => {""" + _LABELLED_CONTROL_XPATH_JS + """
+    for (let i = 0; i < res.snapshotLength; i++) {
+        const el = res.snapshotItem(i);
+        if (el.offsetParent !== null && el.offsetWidth > 20) {
+            el.click();
+            return true;
+        }
+    }
+    return false;
+}"""
+
+# All plausibly QR-sized <img> elements, collected in one pass
+QR_IMG_CANDIDATES_JS = """() => {
+    return Array.from(document.images).map((img, i) => {
+        const r = img.getBoundingClientRect();
+        return {i: i, src: img.src || '', w: r.width, h: r.height};
+    }).filter(c =>
+        c.w > 140 && c.w < 320 && c.h > 140 && c.h < 320 &&
+        c.w / c.h > 0.9 && c.w / c.h < 1.1 &&
+        c.src.startsWith('data:image/png') && c.src.length > 2000
+    );
+}"""
+
+# True once any large canvas has painted non-trivial pixels. Samples a
+# 2x2 block at the canvas center: the top-left corner is usually quiet-
+# zone border, so center pixels flip sooner and the readback is 16 bytes
+_QR_READY_CHECK_JS = """
+    const ready = () => {
+        const canvases = document.querySelectorAll('canvas');
+        for (const canvas of canvases) {
+            if (canvas.width > 100 && canvas.height > 100) {
+                const ctx = canvas.getContext('2d', { willReadFrequently: true });
+                if (ctx) {
+                    const data = ctx.getImageData(canvas.width >> 1, canvas.height >> 1, 2, 2).data;
+                    for (let i = 0; i < data.length; i++) {
+                        if (data[i] !== 0 && data[i] !== 255) return true;
+                    }
+                }
+            }
+        }
+        return false;
+    };
+"""
+
+# Single round-trip QR wait: the promise lives in the page and resolves as
+# soon as the QR paints. Canvas draws don't fire DOM mutations, so the
+# observer (which catches the canvas being inserted) is paired with a
+# 250ms interval for the paint itself; 20s cap mirrors the old 10x2s loop.
+QR_WAIT_JS = """() => new Promise(resolve => {""" + _QR_READY_CHECK_JS + """
+    if (ready()) return resolve(true);
+    let timer = null, interval = null;
+    const finish = (ok) => {
+        obs.disconnect(); clearTimeout(timer); clearInterval(interval);
+        resolve(ok);
+    };
+    const obs = new MutationObserver(() => { if (ready()) finish(true); });
+    obs.observe(document.body, {subtree: true, childList: true, attributes: true});
+    interval = setInterval(() => { if (ready()) finish(true); }, 250);
+    timer = setTimeout(() => finish(ready()), 20000);
+})"""
+
+# Classify a canvas as QR-like: overwhelmingly black/white, barely any
+# color. Downscale into a 32x32 offscreen canvas first so the readback is
+# 4KB instead of up to ~400KB RGBA for a 320x320 canvas; 1024 sampled
+# pixels classify just as reliably as the full grid.
+CANVAS_IS_QR_JS = """(canvas) => {
+    const off = document.createElement('canvas');
+    off.width = 32; off.height = 32;
+    const octx = off.getContext('2d', { willReadFrequently: true });
+    if (!octx) return false;
+    octx.drawImage(canvas, 0, 0, canvas.width, canvas.height, 0, 0, 32, 32);
+    const data = octx.getImageData(0, 0, 32, 32).data;
+    // One u32 load per pixel instead of three u8 channel reads; the mask
+    // keeps the top 3 bits of each channel (0xE0 ~ thresholds at 32/224,
+    // close to the old 50/200 cut). Little-endian: 0x00BBGGRR, alpha high.
+    const u32 = new Uint32Array(data.buffer);
+    let blackCount = 0, whiteCount = 0, colorCount = 0;
+    for (let i = 0; i < u32.length; i++) {
+        const masked = u32[i] & 0x00E0E0E0;
+        if (masked === 0) blackCount++;
+        else if (masked === 0x00E0E0E0) whiteCount++;
+        else colorCount++;
+    }
+    const total = u32.length;
+    return (blackCount + whiteCount) / total > 0.9 && colorCount / total < 0.1;
+}"""
+
+# First QR-plausible data-URL src under any known QR container
+QR_CONTAINER_SRC_JS = """(sel) => {
+    for (const img of document.querySelectorAll(sel)) {
+        const r = img.getBoundingClientRect();
+        if (r.width > 140 && r.width < 320 && r.height > 140 && r.height < 320) {
+            const s = img.src || '';
+            if (s.startsWith('data:image') && s.length > 2000) return s;
+        }
+    }
+    return null;
+}"""
+
+# Request types the login page pulls that the QR flow never needs.
+# Stylesheets stay: the click scans rely on offsetParent/offsetWidth,
+# which need real layout. Network-served images stay only if the URL
+# looks QR-related; the usual QR <img> is a data: URI and never routed.
+BLOCKED_RESOURCE_TYPES = frozenset({"media", "font"})
+
+
+async def _abort_heavy_resources(route):
+    rt = route.request.resource_type
+    if rt in BLOCKED_RESOURCE_TYPES or (
+        rt == "image" and "qr" not in route.request.url.lower()
+    ):
+        await route.abort()
+    else:
+        await route.continue_()
+
 
 STEALTH_JS = """
-Object.defineProperty(navigator, "webdriver", {get: () => undefined, configurable: true});
-Object.defineProperty(navigator, "plugins", {
-    get: () => {
-        const p = [{name:"Chrome PDF Plugin"},{name:"Chrome PDF Viewer"},{name:"Native Client"}];
-        p.item = (i) => p[i]; p.namedItem = (n) => p.find(x => x.name === n); p.refresh = () => {};
-        return p;
-    }, configurable: true
-});
-Object.defineProperty(navigator, "languages", {get: () => ["zh-CN","zh","en-US","en"], configurable: true});
-Object.defineProperty(navigator, "platform", {get: () => "Win32", configurable: true});
-window.chrome = {runtime:{connect:()=>{},sendMessage:()=>{},onMessage:{addListener:()=>{}}},loadTimes:()=>{},csi:()=>{},app:{}};
+(() => {
+    const plugins = [{name:"Chrome PDF Plugin"},{name:"Chrome PDF Viewer"},{name:"Native Client"}];
+    plugins.item = (i) => plugins[i];
+    plugins.namedItem = (n) => plugins.find(x => x.name === n);
+    plugins.refresh = () => {};
+    const overrides = {
+        webdriver: undefined,
+        plugins: plugins,
+        languages: ["zh-CN","zh","en-US","en"],
+        platform: "Win32",
+        hardwareConcurrency: 8,
+        deviceMemory: 8
+    };
+    const descriptors = {};
+    for (const [name, value] of Object.entries(overrides)) {
+        descriptors[name] = {get: () => value, configurable: true};
+    }
+    Object.defineProperties(Navigator.prototype, descriptors);
+    window.chrome = {runtime:{connect:()=>{},sendMessage:()=>{},onMessage:{addListener:()=>{}}},loadTimes:()=>{},csi:()=>{},app:{}};
+})();
 """
 
+def _minify_js(source: str) -> str:
+    """Strip comments and collapse whitespace; enough for our own snippets."""
+    source = re.sub(r"//[^\n]*", "", source)
+    return re.sub(r"\s+", " ", source).strip()
+
+
+# Minified once at import; every new context ships the same small blob
+# over CDP instead of the pretty-printed source.
+STEALTH_INIT_SCRIPT = _minify_js(STEALTH_JS)
+
+# Written to disk once so add_init_script(path=...) lets Playwright cache
+# the script file instead of re-marshalling the string per context
+_STEALTH_PATH = Path(tempfile.gettempdir()) / "douyin_stealth.js"
+_STEALTH_PATH.write_text(STEALTH_INIT_SCRIPT)
+
 
 class QRCodeLoginService:
     # Use creator platform - has QR code login
     DOUYIN_LOGIN_URL = "https://creator.douyin.com/"
 
+    # Every container layout Douyin has shipped for the login QR, as one
+    # comma-unioned query so the page is scanned in a single pass
+    QR_CONTAINER_SELECTOR = (
+        'div[class*="qrcode"] img, div[class*="QRCode"] img, div[class*="qr-code"] img, '
+        "div.web-login-scan-code img, img[alt*='二维码'], img[src*='qrcode'], "
+        "#qrcode img, div.login-qrcode img"
+    )
+
     def __init__(self):
-        self.browser = None
         self.context = None
         self.page = None
+        self._owns_context = True
 
     async def start_login_session(self, session_id: str, max_retries: int = 3) -> Dict[str, Any]:
         last_error = None
-        display = os.environ.get("DISPLAY")
-        use_headless = display is None
+        use_headless = _resolve_headless()
 
-        if use_headless:
-            try:
-                import subprocess
-                result = subprocess.run(["pgrep", "-x", "Xvfb"], capture_output=True, text=True)
-                if result.returncode == 0:
-                    os.environ["DISPLAY"] = ":99"
-                    use_headless = False
-                    logger.info("Detected Xvfb, setting DISPLAY=:99")
-            except Exception:
-                pass
+        # One UA draw per session, not per attempt - retries presenting a
+        # different browser version mid-flow is itself a fingerprint tell
+        chrome_ver = random.randint(120, 130)
+        ua = f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/{chrome_ver}.0.0.0 Safari/537.36"
 
         for attempt in range(max_retries):
             try:
-                from playwright.async_api import async_playwright
-
                 logger.info(f"Starting QR login session: {session_id} (attempt {attempt + 1}/{max_retries})")
-                playwright = await async_playwright().start()
 
-                chrome_ver = random.randint(120, 130)
-                ua = f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/{chrome_ver}.0.0.0 Safari/537.36"
-
-                self.browser = await playwright.chromium.launch(
-                    headless=use_headless,
-                    args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-blink-features=AutomationControlled",
-                          "--disable-dev-shm-usage", "--window-size=1920,1080", f"--user-agent={ua}"]
-                )
-
-                self.context = await self.browser.new_context(
-                    user_agent=ua, viewport={"width": 1920, "height": 1080},
-                    locale="zh-CN", timezone_id="Asia/Shanghai"
-                )
-                await self.context.add_init_script(STEALTH_JS)
+                if settings.playwright_user_data_dir:
+                    # The profile admits a single live context (Chromium's
+                    # singleton lock), so overlapping sessions share it -
+                    # configured once at launch - and each owns only its page
+                    self.context = await _get_persistent_context(use_headless, ua, chrome_ver)
+                    self._owns_context = False
+                else:
+                    browser = await _get_browser(use_headless)
+                    self.context = await browser.new_context(
+                        user_agent=ua, viewport={"width": 1920, "height": 1080},
+                        locale="zh-CN", timezone_id="Asia/Shanghai"
+                    )
+                    self._owns_context = True
+                    await self.context.set_extra_http_headers(_client_hint_headers(chrome_ver))
+                    await self.context.add_init_script(path=str(_STEALTH_PATH))
+                    # Skip video previews, fonts and decorative images; the
+                    # page becomes interactive seconds sooner on slow networks.
+                    # Context-level so any popup the login flow opens is covered.
+                    await self.context.route("**/*", _abort_heavy_resources)
                 self.page = await self.context.new_page()
 
                 logger.info("Navigating to Douyin Creator...")
                 await self.page.goto(self.DOUYIN_LOGIN_URL, wait_until="domcontentloaded", timeout=60000)
-                await asyncio.sleep(5)
+                # Wait for the login UI to render rather than a flat 5s
+                try:
+                    await self.page.wait_for_function(TEXT_VISIBLE_JS, arg="我是创作者", timeout=10_000)
+                except Exception:
+                    logger.debug("'我是创作者' not seen within 10s, continuing")
 
-                await self.page.screenshot(path=f"/tmp/step1_creator_{session_id}.png")
+                if settings.debug_qr:
+                    await self.page.screenshot(path=f"/tmp/step1_creator_{session_id}.png")
                 logger.info("Step 1: Page loaded")
 
                 # Click "我是创作者" button/tab using JavaScript (more reliable)
-                clicked_creator = await self.page.evaluate("""() => {
-                    const els = document.querySelectorAll('*');
-                    for (const el of els) {
-                        const text = el.innerText || el.textContent || '';
-                        if (text.trim() === '我是创作者' && el.offsetParent !== null) {
-                            el.click();
-                            return true;
-                        }
-                    }
-                    return false;
-                }""")
+                clicked_creator = await self.page.evaluate(CLICK_BY_TEXT_JS, "我是创作者")
                 if clicked_creator:
                     logger.info("Clicked '我是创作者' via JS")
-                    await asyncio.sleep(3)
+                    try:
+                        await self.page.wait_for_function(TEXT_VISIBLE_JS, arg="扫码登录", timeout=5_000)
+                    except Exception:
+                        logger.debug("'扫码登录' tab not seen within 5s, continuing")
 
                 # Click "扫码登录" tab using JavaScript (this triggers QR code loading)
-                clicked_qr = await self.page.evaluate("""() => {
-                    const els = document.querySelectorAll('*');
-                    for (const el of els) {
-                        const text = el.innerText || el.textContent || '';
-                        if (text.trim() === '扫码登录' && el.offsetParent !== null && el.offsetWidth > 20) {
-                            el.click();
-                            return true;
-                        }
-                    }
-                    return false;
-                }""")
+                clicked_qr = await self.page.evaluate(CLICK_BY_TEXT_JS, "扫码登录")
                 if clicked_qr:
                     logger.info("Clicked '扫码登录' tab via JS")
-                    await asyncio.sleep(3)
+                    # No settle sleep needed - the canvas poll below waits for
+                    # the QR to actually render
 
-                await self.page.screenshot(path=f"/tmp/step2_afterlogin_{session_id}.png")
+                if settings.debug_qr:
+                    await self.page.screenshot(path=f"/tmp/step2_afterlogin_{session_id}.png")
 
-                # Wait for QR code to actually load - poll until canvas has content
+                # Wait for QR code to actually load - one in-page promise
+                # instead of up to ten evaluate round-trips at 2s intervals
                 logger.info("Waiting for QR code to load...")
-                for wait_attempt in range(10):
-                    await asyncio.sleep(2)
-                    # Check if any canvas has actual content
-                    has_qr = await self.page.evaluate("""() => {
-                        const canvases = document.querySelectorAll('canvas');
-                        for (const canvas of canvases) {
-                            if (canvas.width > 100 && canvas.height > 100) {
-                                const ctx = canvas.getContext('2d');
-                                if (ctx) {
-                                    const data = ctx.getImageData(0, 0, 10, 10).data;
-                                    // Check if there's actual pixel data (not all zeros)
-                                    for (let i = 0; i < data.length; i++) {
-                                        if (data[i] !== 0 && data[i] !== 255) return true;
-                                    }
-                                }
-                            }
-                        }
-                        return false;
-                    }""")
-                    if has_qr:
-                        logger.info(f"QR code loaded after {(wait_attempt + 1) * 2} seconds")
-                        break
-                    logger.debug(f"QR not ready yet, waiting... ({wait_attempt + 1}/10)")
-
-                await self.page.screenshot(path=f"/tmp/step3_qrpage_{session_id}.png")
+                has_qr = await self.page.evaluate(QR_WAIT_JS)
+                if has_qr:
+                    logger.info("QR code loaded")
+                else:
+                    logger.debug("QR not detected within 20s, proceeding to capture anyway")
+
+                # The debug screenshot is independent of the QR capture, so
+                # let it run concurrently instead of serializing the two
+                debug_task = None
+                if settings.debug_qr:
+                    debug_task = asyncio.create_task(
+                        self.page.screenshot(path=f"/tmp/step3_qrpage_{session_id}.png")
+                    )
                 logger.info("Step 3: Looking for QR code")
 
                 # Capture QR code
                 qr_image_base64 = await self._capture_qr_code(session_id)
+                if debug_task:
+                    await debug_task
 
                 if qr_image_base64:
-                    login_sessions[session_id] = {
-                        "status": "waiting", "qr_image": qr_image_base64,
-                        "created_at": datetime.now(), "service": self, "playwright": playwright
-                    }
-                    return {"success": True, "session_id": session_id, "qr_image": qr_image_base64,
-                            "message": "请使用抖音 App 扫描二维码登录"}
+                    message = "请使用抖音 App 扫描二维码登录"
                 else:
-                    screenshot_path = f"/tmp/step3_qrpage_{session_id}.png"
-                    with open(screenshot_path, "rb") as f:
-                        screenshot_base64 = base64.b64encode(f.read()).decode()
-                    login_sessions[session_id] = {
-                        "status": "waiting", "qr_image": screenshot_base64,
-                        "created_at": datetime.now(), "service": self, "playwright": playwright
-                    }
-                    return {"success": True, "session_id": session_id, "qr_image": screenshot_base64,
-                            "message": "请在页面中找到二维码并扫描登录"}
+                    # Fall back to a viewport-center capture, straight from
+                    # memory - no PNG round-trip through /tmp. The login modal
+                    # (and its QR) sits in the middle of the viewport, so a
+                    # 500x500 clip carries the same information as the full
+                    # page at a tenth of the bytes. JPEG at quality 70 shrinks
+                    # it further and stays scannable; encode off the loop.
+                    vp = self.page.viewport_size or {"width": 1920, "height": 1080}
+                    clip = {"x": max(0, vp["width"] / 2 - 250),
+                            "y": max(0, vp["height"] / 2 - 250),
+                            "width": min(500, vp["width"]), "height": min(500, vp["height"])}
+                    screenshot_bytes = await self.page.screenshot(type="jpeg", quality=70, clip=clip)
+                    qr_image_base64 = await asyncio.to_thread(
+                        lambda: "data:image/jpeg;base64,"
+                                + _b64encode(screenshot_bytes).decode("ascii")
+                    )
+                    message = "请在页面中找到二维码并扫描登录"
+
+                session = LoginSession(
+                    status="waiting", qr_image=qr_image_base64,
+                    expires_at=time.monotonic() + SESSION_TTL_S, service=self
+                )
+                await _evict_for_capacity()
+                login_sessions[session_id] = session
+                _ensure_sweeper()
+                # One long-lived in-browser wait instead of CDP round-trips
+                # on every frontend poll
+                session.login_waiter = asyncio.create_task(self._await_login(session_id))
+                return {"success": True, "session_id": session_id, "qr_image": qr_image_base64,
+                        "message": message}
 
             except Exception as e:
                 last_error = e
@@ -183,23 +646,15 @@ class QRCodeLoginService:
         """Capture QR code image - must be actual QR code, not decorative images."""
         try:
             # Method 1: Look for img elements with data:image src (most reliable for QR codes)
+            # Collect all candidates in one page.evaluate instead of per-image
+            # bounding_box/get_attribute round-trips.
             logger.info("Looking for QR code images...")
-            images = await self.page.query_selector_all("img")
-            for img in images:
-                try:
-                    box = await img.bounding_box()
-                    if box and 140 < box["width"] < 320 and 140 < box["height"] < 320:
-                        ratio = box["width"] / box["height"]
-                        if 0.9 < ratio < 1.1:
-                            src = await img.get_attribute("src") or ""
-                            # Real QR codes as base64 PNG are typically > 2000 chars
-                            # The QR code we need should be a large data:image
-                            if src.startswith("data:image/png") and len(src) > 2000:
-                                logger.info(f"Found QR image: {box['width']:.0f}x{box['height']:.0f}, src length: {len(src)}")
-                                screenshot = await img.screenshot()
-                                return base64.b64encode(screenshot).decode()
-                except Exception:
-                    continue
+            candidates = await self.page.evaluate(QR_IMG_CANDIDATES_JS)
+            for cand in candidates:
+                # The img src already is the QR as a data URL - hand it to the
+                # frontend as-is instead of screenshotting and re-encoding it
+                logger.info(f"Found QR image: {cand['w']:.0f}x{cand['h']:.0f}, src length: {len(cand['src'])}")
+                return cand["src"]
 
             # Method 2: Look for canvas that contains actual QR code (black/white pattern)
             logger.info("Looking for QR code canvas...")
@@ -211,54 +666,28 @@ class QRCodeLoginService:
                         ratio = box["width"] / box["height"]
                         if 0.9 < ratio < 1.1:
                             # Check if canvas has QR-like content (black and white, not colorful)
-                            is_qr = await self.page.evaluate("""(canvas) => {
-                                const ctx = canvas.getContext('2d');
-                                if (!ctx) return false;
-                                const w = canvas.width, h = canvas.height;
-                                const data = ctx.getImageData(0, 0, w, h).data;
-                                let blackCount = 0, whiteCount = 0, colorCount = 0;
-                                for (let i = 0; i < data.length; i += 4) {
-                                    const r = data[i], g = data[i+1], b = data[i+2];
-                                    if (r < 50 && g < 50 && b < 50) blackCount++;
-                                    else if (r > 200 && g > 200 && b > 200) whiteCount++;
-                                    else colorCount++;
-                                }
-                                const total = w * h;
-                                // QR codes are mostly black and white with very few colors
-                                return (blackCount + whiteCount) / total > 0.9 && colorCount / total < 0.1;
-                            }""", canvas)
+                            is_qr = await self.page.evaluate(CANVAS_IS_QR_JS, canvas)
                             if is_qr:
                                 logger.info(f"Found QR canvas (verified): {box['width']:.0f}x{box['height']:.0f}")
                                 screenshot = await canvas.screenshot()
-                                return base64.b64encode(screenshot).decode()
+                                return await asyncio.to_thread(
+                                    lambda: "data:image/png;base64,"
+                                            + _b64encode(screenshot).decode("ascii")
+                                )
                             else:
                                 logger.debug(f"Canvas {box['width']:.0f}x{box['height']:.0f} is decorative, skipping")
                 except Exception as e:
                     logger.debug(f"Canvas check failed: {e}")
                     continue
 
-            # Method 3: Look for img in QR-specific containers
+            # Method 3: Look for img in QR-specific containers. All selectors
+            # are checked inside a single evaluate instead of per-selector
+            # locator count/bounding_box/get_attribute round-trips.
             logger.info("Looking for QR code in containers...")
-            qr_selectors = [
-                'div[class*="qrcode"] img',
-                'div[class*="QRCode"] img',
-                'div[class*="qr-code"] img',
-            ]
-            for selector in qr_selectors:
-                try:
-                    elements = self.page.locator(selector)
-                    count = await elements.count()
-                    for i in range(count):
-                        el = elements.nth(i)
-                        box = await el.bounding_box()
-                        if box and 140 < box["width"] < 320 and 140 < box["height"] < 320:
-                            src = await el.get_attribute("src") or ""
-                            if src.startswith("data:image") and len(src) > 2000:
-                                logger.info(f"Found QR in container: {selector}")
-                                screenshot = await el.screenshot()
-                                return base64.b64encode(screenshot).decode()
-                except Exception:
-                    continue
+            src = await self.page.evaluate(QR_CONTAINER_SRC_JS, self.QR_CONTAINER_SELECTOR)
+            if src:
+                logger.info("Found QR in container")
+                return src
 
             logger.warning("QR code not found - page may not have loaded QR code")
             return None
@@ -266,60 +695,117 @@ class QRCodeLoginService:
             logger.error(f"Capture error: {e}")
             return None
 
+    async def _await_login(self, session_id: str):
+        """Wait inside the browser for the login to complete, then save the cookie."""
+        session = login_sessions.get(session_id)
+        if not session or not self.page:
+            return
+        try:
+            await self.page.wait_for_function(LOGIN_DONE_JS, timeout=LOGIN_WAIT_TIMEOUT_MS)
+            await self._finish_login(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if "Timeout" in type(e).__name__:
+                # LOGIN_DONE_JS runs in-page and cannot see an HttpOnly
+                # sessionid; confirm over CDP before declaring the scan
+                # missed, as scripts/get_cookie.py does after its timeout
+                try:
+                    cookies = await self.context.cookies()
+                    if any(c["name"] == "sessionid" and c["value"] for c in cookies):
+                        await self._finish_login(session, cookies)
+                        return
+                except Exception as fallback_error:
+                    logger.warning(f"Post-timeout cookie check failed: {fallback_error}")
+                # The scan never happened; release the browser context now
+                # rather than waiting for a poll to notice the expiry
+                session.status = "expired"
+                await self.cleanup()
+            else:
+                session.status = "error"
+                session.error = str(e)
+
+    async def _finish_login(self, session: LoginSession, cookies: Optional[list] = None):
+        """Harvest the essential cookies, persist them, and mark success."""
+        if cookies is None:
+            cookies = await self.context.cookies()
+        # Single pass: collect the essential cookies to persist and track
+        # which ones are missing, without building an intermediate dict
+        parts = []
+        missing = set(ESSENTIAL_COOKIES)
+        for c in cookies:
+            name = c["name"]
+            if name in ESSENTIAL_COOKIES and c["value"]:
+                parts.append(f"{name}={c['value']}")
+                missing.discard(name)
+        cookie_string = "; ".join(parts)
+        if missing:
+            logger.warning(f"Login cookies incomplete, missing: {sorted(missing)}")
+        await self._save_cookie(cookie_string)
+        # The full string now lives in .env/settings; the session only
+        # needs the display preview, so the multi-KB cookie isn't pinned
+        # in the store until the sweeper gets to it
+        session.cookie = cookie_string[:100]
+        session.status = "success"
+
     async def check_login_status(self, session_id: str) -> Dict[str, Any]:
         session = login_sessions.get(session_id)
         if not session:
             return {"status": "expired", "message": "登录会话已过期"}
 
-        if datetime.now() - session["created_at"] > timedelta(minutes=5):
+        if time.monotonic() > session.expires_at:
             await self.cleanup_session(session_id)
             return {"status": "expired", "message": "登录会话已过期"}
 
-        service = session.get("service")
-        if not service or not service.page:
-            return {"status": "error", "message": "登录会话异常"}
+        # The login waiter transitions the session state; polling is now a
+        # pure attribute read with no Playwright round-trips.
+        if session.status == "success":
+            cookie_preview = session.cookie or ""
+            # Release the browser context but keep the entry until the TTL
+            # sweeper drops it, so a second tab polling the same session
+            # also sees "success" instead of a spurious "expired".
+            await self.cleanup()
+            return {"status": "success", "message": "登录成功！Cookie已保存",
+                    "cookie": cookie_preview + "..."}
+        if session.status == "error":
+            return {"status": "error", "message": session.error or "登录会话异常"}
+        if session.status == "expired":
+            await self.cleanup_session(session_id)
+            return {"status": "expired", "message": "登录会话已过期"}
 
-        try:
-            cookies = await service.context.cookies()
-            cookie_dict = {c["name"]: c["value"] for c in cookies}
-
-            is_logged_in = False
-            if cookie_dict.get("LOGIN_STATUS") == "1":
-                is_logged_in = True
-            if cookie_dict.get("sessionid"):
-                is_logged_in = True
-
-            if is_logged_in:
-                cookie_string = "; ".join([f"{c['name']}={c['value']}" for c in cookies])
-                session["status"] = "success"
-                await self._save_cookie(cookie_string)
-                await self.cleanup_session(session_id)
-                return {"status": "success", "message": "登录成功！Cookie已保存",
-                        "cookie": cookie_string[:100] + "..."}
-
-            return {"status": "waiting", "message": "等待扫码..."}
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        return {"status": "waiting", "message": "等待扫码..."}
+
+    @staticmethod
+    def _write_env(cookie: str):
+        env_content = ""
+        if ENV_PATH.exists():
+            with open(ENV_PATH, "r") as f:
+                env_content = f.read()
+
+        replacement = f'DOUYIN_COOKIE="{cookie}"'
+        if replacement in env_content:
+            # Same cookie already on disk (common when re-logging in with a
+            # live session) - skip the rewrite entirely
+            return
+        env_content, n = _COOKIE_LINE_RE.subn(
+            replacement.replace("\\", "\\\\"), env_content, count=1
+        )
+        if n == 0:
+            env_content += f"\n{replacement}\n"
+
+        # Write to a sibling temp file and rename so a crash mid-write can't
+        # leave a truncated .env behind
+        tmp_path = ENV_PATH.with_name(".env.tmp")
+        with open(tmp_path, "w") as f:
+            f.write(env_content)
+        os.replace(tmp_path, ENV_PATH)
 
     async def _save_cookie(self, cookie: str):
         try:
-            env_path = Path(__file__).parent.parent.parent / ".env"
-            env_content = ""
-            if env_path.exists():
-                with open(env_path, "r") as f:
-                    env_content = f.read()
-
-            if "DOUYIN_COOKIE=" in env_content:
-                lines = env_content.split("\n")
-                new_lines = [f'DOUYIN_COOKIE="{cookie}"' if l.startswith("DOUYIN_COOKIE=") else l for l in lines]
-                env_content = "\n".join(new_lines)
-            else:
-                env_content += f'\nDOUYIN_COOKIE="{cookie}"\n'
-
-            with open(env_path, "w") as f:
-                f.write(env_content)
+            # File I/O is blocking; run it in a worker thread so the event
+            # loop keeps serving other sessions during the save
+            await asyncio.to_thread(self._write_env, cookie)
             logger.info("Cookie saved")
-            from app.config import settings
             settings.douyin_cookie = cookie
         except Exception as e:
             logger.error(f"Save error: {e}")
@@ -327,23 +813,31 @@ class QRCodeLoginService:
     async def cleanup_session(self, session_id: str):
         session = login_sessions.pop(session_id, None)
         if session:
-            service = session.get("service")
-            if service:
-                await service.cleanup()
-            playwright = session.get("playwright")
-            if playwright:
-                await playwright.stop()
+            if session.login_waiter and not session.login_waiter.done():
+                session.login_waiter.cancel()
+            if session.service:
+                await session.service.cleanup()
+            if session.playwright:
+                await session.playwright.stop()
 
     async def cleanup(self):
+        # Only tear down per-session state; the shared browser stays warm.
+        # context.close() also closes its pages, so closing the page first
+        # would just be an extra IPC round-trip. The shared persistent
+        # context likewise outlives the session - there only this
+        # session's page is closed. Nulling the handles makes repeat calls
+        # (concurrent polls, sweeper after a success poll) and partially
+        # initialized sessions cheap no-ops.
         try:
-            if self.page:
-                await self.page.close()
-            if self.context:
+            if self.context and self._owns_context:
                 await self.context.close()
-            if self.browser:
-                await self.browser.close()
+            elif self.page:
+                await self.page.close()
         except Exception as e:
             logger.error(f"Cleanup error: {e}")
+        finally:
+            self.page = None
+            self.context = None
 
 
 qrcode_login_service = QRCodeLoginService()
@@ -357,14 +851,11 @@ async def check_session_status(session_id: str) -> Dict[str, Any]:
     session = login_sessions.get(session_id)
     if not session:
         return {"status": "expired", "message": "会话不存在"}
-    service = session.get("service")
-    if service:
-        return await service.check_login_status(session_id)
+    if session.service:
+        return await session.service.check_login_status(session_id)
     return {"status": "error", "message": "会话异常"}
 
 async def cancel_login_session(session_id: str):
     session = login_sessions.get(session_id)
-    if session:
-        service = session.get("service")
-        if service:
-            await service.cleanup_session(session_id)
+    if session and session.service:
+        await session.service.cleanup_session(session_id)
@@ -3,19 +3,29 @@ Ranking/hot list related business logic service.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.crawler import DouyinCrawler
+from app.cache.local_cache import local_cache
+from app.core.crawler import get_crawler
+
+# Hot lists refresh upstream about once a minute; short TTLs keep crawler
+# QPS flat no matter how often the frontend refreshes
+BOARD_LIST_CACHE_TTL = 60
+RANKING_CACHE_TTL = 30
 
 
 class RankingService:
     """Service for ranking operations."""
 
     def __init__(self):
-        self.crawler = DouyinCrawler()
+        self.crawler = get_crawler()
 
     async def get_board_list(self, db: AsyncSession) -> dict:
         """Get available ranking boards."""
+        cached = local_cache.get("ranking:boards")
+        if cached is not None:
+            return cached
+
         data = await self.crawler.get_board_list()
-        return data or {
+        result = data or {
             "boards": [
                 {"id": "hot_search", "name": "热搜榜"},
                 {"id": "hot_video", "name": "视频榜"},
@@ -24,18 +34,41 @@ class RankingService:
                 {"id": "hot_music", "name": "音乐榜"}
             ]
         }
+        local_cache.set("ranking:boards", result, ttl=BOARD_LIST_CACHE_TTL)
+        return result
 
     async def get_hot_list(self, board_type: str, db: AsyncSession) -> dict:
         """Get hot list by board type."""
+        cache_key = f"ranking:hot_list:{board_type}"
+        cached = local_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         data = await self.crawler.get_hot_list(board_type)
-        return data or {"items": [], "board_type": board_type}
+        result = data or {"items": [], "board_type": board_type}
+        local_cache.set(cache_key, result, ttl=RANKING_CACHE_TTL)
+        return result
 
     async def get_video_ranking(self, count: int, db: AsyncSession) -> dict:
         """Get video ranking."""
+        cache_key = f"ranking:videos:{count}"
+        cached = local_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         data = await self.crawler.get_video_ranking(count)
-        return data or {"videos": [], "total": 0}
+        result = data or {"videos": [], "total": 0}
+        local_cache.set(cache_key, result, ttl=RANKING_CACHE_TTL)
+        return result
 
     async def get_live_ranking(self, count: int, db: AsyncSession) -> dict:
         """Get live ranking."""
+        cache_key = f"ranking:lives:{count}"
+        cached = local_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         data = await self.crawler.get_live_ranking(count)
-        return data or {"lives": [], "total": 0}
+        result = data or {"lives": [], "total": 0}
+        local_cache.set(cache_key, result, ttl=RANKING_CACHE_TTL)
+        return result
@@ -3,14 +3,19 @@ Search-related business logic service.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.crawler import DouyinCrawler
+from app.cache.local_cache import local_cache
+from app.core.crawler import get_crawler
+
+# Trending keywords move on the order of minutes; no point re-crawling
+# per page view
+TRENDING_CACHE_TTL = 60
 
 
 class SearchService:
     """Service for search operations."""
 
     def __init__(self):
-        self.crawler = DouyinCrawler()
+        self.crawler = get_crawler()
 
     async def search_video(
         self,
@@ -42,5 +47,11 @@ class SearchService:
 
     async def get_trending_searches(self, db: AsyncSession) -> dict:
         """Get trending search keywords."""
+        cached = local_cache.get("search:trending")
+        if cached is not None:
+            return cached
+
         data = await self.crawler.get_trending_searches()
-        return data or {"trends": []}
+        result = data or {"trends": []}
+        local_cache.set("search:trending", result, ttl=TRENDING_CACHE_TTL)
+        return result
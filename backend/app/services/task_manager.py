@@ -4,7 +4,7 @@ Task management service.
 from typing import Optional, List
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, delete, func
 from loguru import logger
 
 from app.models.task import MonitorTask, TaskLog
@@ -38,12 +38,11 @@ class TaskManager:
         result = await db.execute(query)
         tasks = result.scalars().all()
 
-        # Count total
-        count_query = select(MonitorTask)
+        # Count total in the database instead of materializing every row
+        count_query = select(func.count()).select_from(MonitorTask)
         if conditions:
             count_query = count_query.where(and_(*conditions))
-        count_result = await db.execute(count_query)
-        total = len(count_result.scalars().all())
+        total = (await db.execute(count_query)).scalar_one()
 
         return {
             "tasks": [
@@ -127,14 +126,9 @@ class TaskManager:
 
     async def delete_task(self, task_id: int, db: AsyncSession) -> bool:
         """Delete a task."""
-        result = await db.execute(select(MonitorTask).where(MonitorTask.id == task_id))
-        db_task = result.scalar_one_or_none()
-
-        if not db_task:
-            return False
-
-        await db.delete(db_task)
-        return True
+        # Single DELETE ... WHERE; no need to hydrate the row first
+        result = await db.execute(delete(MonitorTask).where(MonitorTask.id == task_id))
+        return result.rowcount > 0
 
     async def run_task(self, task_id: int, db: AsyncSession) -> Optional[dict]:
         """Run a task immediately."""
@@ -175,6 +169,13 @@ class TaskManager:
         )
         logs = result.scalars().all()
 
+        # Real row count; len(logs) is just the page size once the table
+        # outgrows the limit
+        count_query = (
+            select(func.count()).select_from(TaskLog).where(TaskLog.task_id == task_id)
+        )
+        total = (await db.execute(count_query)).scalar_one()
+
         return {
             "task_id": task_id,
             "logs": [
@@ -187,5 +188,5 @@ class TaskManager:
                 }
                 for l in logs
             ],
-            "total": len(logs)
+            "total": total
         }
@@ -1,75 +1,186 @@
 """
 User-related business logic service.
 """
+import asyncio
+from operator import attrgetter
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from loguru import logger
 
 from app.models.user import User, UserSnapshot
-from app.core.crawler import DouyinCrawler
+from app.core.crawler import get_crawler
+from app.cache.local_cache import local_cache
+
+# Cap on concurrent profile fetches so a large batch doesn't hammer the API
+FETCH_CONCURRENCY = 64
+
+# Profiles barely move within a minute; repeated compare/batch calls for
+# the same sec_uid within the TTL skip the API round-trip entirely.
+PROFILE_CACHE_TTL = 60
+
+# Fixed projection for serialized profiles: one C-level attrgetter call
+# instead of fifteen attribute loads per row
+_USER_FIELDS = (
+    "id", "sec_uid", "uid", "nickname", "unique_id", "signature",
+    "avatar_url", "follower_count", "following_count", "total_favorited",
+    "aweme_count", "is_verified", "verify_info", "region",
+    "created_at", "updated_at"
+)
+_user_values = attrgetter(*_USER_FIELDS)
 
 
 class UserService:
     """Service for user-related operations."""
 
     def __init__(self):
-        self.crawler = DouyinCrawler()
+        self.crawler = get_crawler()
+        self._fetch_sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def _fetch_profile(self, sec_uid: str) -> Optional[dict]:
+        """Fetch one profile from the API, bounded by the shared semaphore."""
+        async with self._fetch_sem:
+            return await self.crawler.get_user_profile(sec_uid)
+
+    async def _batch_profiles(self, sec_uids: List[str], db: AsyncSession) -> List[dict]:
+        """Fetch profiles concurrently, then merge them into the DB.
+
+        The crawler calls are independent I/O and fan out together; the
+        AsyncSession is not safe to share across tasks, so the DB merge
+        stays sequential on this coroutine.
+        """
+        cached = {s: local_cache.get(f"user_profile:{s}") for s in sec_uids}
+        # Dedupe while keeping order: a repeated sec_uid must not fetch
+        # twice or insert two rows behind the same unique key
+        to_fetch = [s for s in dict.fromkeys(sec_uids) if cached[s] is None]
+        fetched = await asyncio.gather(
+            *(self._fetch_profile(s) for s in to_fetch),
+            return_exceptions=True
+        )
+
+        # One IN query for all existing rows instead of a SELECT per sec_uid
+        existing = await self._bulk_fetch_users(to_fetch, db)
+
+        merged = []
+        for sec_uid, profile_data in zip(to_fetch, fetched):
+            if isinstance(profile_data, BaseException):
+                logger.error(f"Error fetching user profile: {profile_data}")
+                profile_data = None
+            user = existing.get(sec_uid)
+            if profile_data:
+                user = self._apply_profile(user, profile_data, db)
+                merged.append((sec_uid, user, True))
+            elif user:
+                merged.append((sec_uid, user, False))
+
+        if merged:
+            # Single flush assigns ids for every new row (all column
+            # defaults are Python-side), then snapshots insert as one batch
+            await db.flush()
+            db.add_all(
+                self._make_snapshot(user)
+                for sec_uid, user, fresh in merged if fresh
+            )
+            for sec_uid, user, fresh in merged:
+                if fresh:
+                    cached[sec_uid] = self._serialize_user(sec_uid, user)
+                else:
+                    # DB fallback after a failed fetch: serve it without
+                    # priming the cache, so the next call retries upstream
+                    # (same policy as _load_user_dict)
+                    cached[sec_uid] = dict(zip(_USER_FIELDS, _user_values(user)))
+
+        return [cached[s] for s in sec_uids if cached[s]]
+
+    async def _bulk_fetch_users(self, sec_uids: List[str], db: AsyncSession) -> dict:
+        """Fetch all existing rows for a batch in one IN query."""
+        if not sec_uids:
+            return {}
+        result = await db.execute(select(User).where(User.sec_uid.in_(sec_uids)))
+        return {u.sec_uid: u for u in result.scalars()}
 
     async def get_user_profile(self, sec_uid: str, db: AsyncSession) -> Optional[dict]:
         """Get user profile from Douyin API and cache in database."""
-        # Try to get from database first
-        result = await db.execute(select(User).where(User.sec_uid == sec_uid))
-        user = result.scalar_one_or_none()
+        profile = local_cache.get(f"user_profile:{sec_uid}")
+        if profile is not None:
+            return profile
 
-        # Fetch fresh data from API
         try:
-            profile_data = await self.crawler.get_user_profile(sec_uid)
-            if profile_data:
-                if user:
-                    # Update existing user
-                    for key, value in profile_data.items():
-                        if hasattr(user, key):
-                            setattr(user, key, value)
-                else:
-                    # Create new user
-                    user = User(**profile_data)
-                    db.add(user)
-                await db.flush()
-                await db.refresh(user)
-
-                # Create snapshot
-                snapshot = UserSnapshot(
-                    user_id=user.id,
-                    follower_count=user.follower_count,
-                    following_count=user.following_count,
-                    total_favorited=user.total_favorited,
-                    aweme_count=user.aweme_count
-                )
-                db.add(snapshot)
+            profile_data = await self._fetch_profile(sec_uid)
         except Exception as e:
             logger.error(f"Error fetching user profile: {e}")
-            if not user:
-                return None
+            profile_data = None
+        return await self._store_profile(sec_uid, profile_data, db)
 
-        return {
-            "id": user.id,
-            "sec_uid": user.sec_uid,
-            "uid": user.uid,
-            "nickname": user.nickname,
-            "unique_id": user.unique_id,
-            "signature": user.signature,
-            "avatar_url": user.avatar_url,
-            "follower_count": user.follower_count,
-            "following_count": user.following_count,
-            "total_favorited": user.total_favorited,
-            "aweme_count": user.aweme_count,
-            "is_verified": user.is_verified,
-            "verify_info": user.verify_info,
-            "region": user.region,
-            "created_at": user.created_at,
-            "updated_at": user.updated_at
-        }
+    @staticmethod
+    def invalidate_profile(sec_uid: str) -> None:
+        """Drop the cached profile after an out-of-band write."""
+        local_cache.delete(f"user_profile:{sec_uid}")
+
+    async def _store_profile(
+        self,
+        sec_uid: str,
+        profile_data: Optional[dict],
+        db: AsyncSession
+    ) -> Optional[dict]:
+        """Merge fetched profile data into the DB and serialize the row."""
+        if not profile_data:
+            # Nothing to write: serve the stored row without hydrating a
+            # mutable ORM entity
+            return await self._load_user_dict(sec_uid, db)
+
+        result = await db.execute(select(User).where(User.sec_uid == sec_uid))
+        user = result.scalar_one_or_none()
+        user = self._apply_profile(user, profile_data, db)
+        await db.flush()
+        db.add(self._make_snapshot(user))
+        return self._serialize_user(sec_uid, user)
+
+    @staticmethod
+    async def _load_user_dict(sec_uid: str, db: AsyncSession) -> Optional[dict]:
+        """Read-only column fetch of the profile fields the API returns.
+
+        Skips ORM instance construction and identity-map tracking; left
+        uncached so the next call retries the upstream API.
+        """
+        result = await db.execute(
+            select(*(getattr(User, f) for f in _USER_FIELDS))
+            .where(User.sec_uid == sec_uid)
+        )
+        row = result.first()
+        return dict(row._mapping) if row else None
+
+    @staticmethod
+    def _apply_profile(user: Optional[User], profile_data: dict, db: AsyncSession) -> User:
+        """Copy fetched fields onto an existing row, or create a new one."""
+        if user:
+            # Update existing user
+            for key, value in profile_data.items():
+                if hasattr(user, key):
+                    setattr(user, key, value)
+        else:
+            # Create new user
+            user = User(**profile_data)
+            db.add(user)
+        return user
+
+    @staticmethod
+    def _make_snapshot(user: User) -> UserSnapshot:
+        """Build a point-in-time snapshot row for a flushed user."""
+        return UserSnapshot(
+            user_id=user.id,
+            follower_count=user.follower_count,
+            following_count=user.following_count,
+            total_favorited=user.total_favorited,
+            aweme_count=user.aweme_count
+        )
+
+    @staticmethod
+    def _serialize_user(sec_uid: str, user: User) -> dict:
+        """Serialize a user row and prime the profile cache."""
+        profile = dict(zip(_USER_FIELDS, _user_values(user)))
+        local_cache.set(f"user_profile:{sec_uid}", profile, ttl=PROFILE_CACHE_TTL)
+        return profile
 
     async def get_user_posts(self, sec_uid: str, cursor: int, count: int, db: AsyncSession) -> dict:
         """Get user's video posts."""
@@ -107,8 +218,18 @@ class UserService:
         from sqlalchemy import and_
 
         start_date = datetime.utcnow() - timedelta(days=days)
-        result = await db.execute(
-            select(UserSnapshot)
+        # Column-only select: plain tuples, no ORM row instantiation per
+        # snapshot. orjson serializes the datetimes natively downstream.
+        # Streamed in driver-side batches so long histories never hold a
+        # second full copy of the result set in memory.
+        result = await db.stream(
+            select(
+                UserSnapshot.follower_count,
+                UserSnapshot.following_count,
+                UserSnapshot.total_favorited,
+                UserSnapshot.aweme_count,
+                UserSnapshot.snapshot_time
+            )
             .where(
                 and_(
                     UserSnapshot.user_id == user_id,
@@ -116,48 +237,51 @@ class UserService:
                 )
             )
             .order_by(UserSnapshot.snapshot_time)
+            .execution_options(yield_per=256)
         )
-        snapshots = result.scalars().all()
 
         return {
             "user_id": user_id,
             "snapshots": [
                 {
-                    "follower_count": s.follower_count,
-                    "following_count": s.following_count,
-                    "total_favorited": s.total_favorited,
-                    "aweme_count": s.aweme_count,
-                    "snapshot_time": s.snapshot_time.isoformat()
+                    "follower_count": follower,
+                    "following_count": following,
+                    "total_favorited": favorited,
+                    "aweme_count": awemes,
+                    "snapshot_time": ts
                 }
-                for s in snapshots
+                async for follower, following, favorited, awemes, ts in result
             ]
         }
 
     async def compare_users(self, sec_uids: List[str], db: AsyncSession) -> dict:
         """Compare multiple users."""
-        users = []
-        for sec_uid in sec_uids:
-            profile = await self.get_user_profile(sec_uid, db)
-            if profile:
-                users.append(profile)
+        users = await self._batch_profiles(sec_uids, db)
 
-        # Calculate comparison metrics
+        # Calculate comparison metrics in one pass instead of four
+        # generator sweeps over the list
         comparison = {}
         if users:
+            max_f = min_f = users[0]["follower_count"]
+            total_f = total_v = 0
+            for u in users:
+                f = u["follower_count"]
+                if f > max_f:
+                    max_f = f
+                elif f < min_f:
+                    min_f = f
+                total_f += f
+                total_v += u["aweme_count"]
             comparison = {
-                "max_followers": max(u["follower_count"] for u in users),
-                "min_followers": min(u["follower_count"] for u in users),
-                "avg_followers": sum(u["follower_count"] for u in users) / len(users),
-                "total_videos": sum(u["aweme_count"] for u in users)
+                "max_followers": max_f,
+                "min_followers": min_f,
+                "avg_followers": total_f / len(users),
+                "total_videos": total_v
             }
 
         return {"users": users, "comparison": comparison}
 
     async def batch_get_users(self, sec_uids: List[str], db: AsyncSession) -> dict:
         """Batch get multiple users."""
-        users = []
-        for sec_uid in sec_uids:
-            profile = await self.get_user_profile(sec_uid, db)
-            if profile:
-                users.append(profile)
+        users = await self._batch_profiles(sec_uids, db)
         return {"users": users, "total": len(users)}
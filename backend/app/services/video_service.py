@@ -1,75 +1,93 @@
 """
 Video-related business logic service.
 """
+from operator import attrgetter
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from loguru import logger
 
 from app.models.video import Video, VideoSnapshot
-from app.core.crawler import DouyinCrawler
+from app.core.crawler import get_crawler
+from app.cache.local_cache import local_cache
+
+# Detail results change slowly; a short TTL absorbs repeated analysis
+# of the same video (dashboards, retries) without hitting API or DB.
+VIDEO_DETAIL_CACHE_TTL = 60
+
+# Fixed projection for serialized details: one C-level attrgetter call
+# instead of fifteen attribute loads per row
+_VIDEO_FIELDS = (
+    "id", "aweme_id", "desc", "video_url", "cover_url", "music_url",
+    "duration", "play_count", "digg_count", "comment_count",
+    "share_count", "collect_count", "create_time",
+    "created_at", "updated_at"
+)
+_video_values = attrgetter(*_VIDEO_FIELDS)
 
 
 class VideoService:
     """Service for video-related operations."""
 
     def __init__(self):
-        self.crawler = DouyinCrawler()
+        self.crawler = get_crawler()
 
     async def get_video_detail(self, aweme_id: str, db: AsyncSession) -> Optional[dict]:
         """Get video detail from Douyin API."""
-        # Try to get from database first
-        result = await db.execute(select(Video).where(Video.aweme_id == aweme_id))
-        video = result.scalar_one_or_none()
+        cached = local_cache.get(f"video_detail:{aweme_id}")
+        if cached is not None:
+            return cached
 
         # Fetch fresh data from API
         try:
             video_data = await self.crawler.get_video_detail(aweme_id)
-            if video_data:
-                if video:
-                    # Update existing video
-                    for key, value in video_data.items():
-                        if hasattr(video, key):
-                            setattr(video, key, value)
-                else:
-                    # Create new video
-                    video = Video(**video_data)
-                    db.add(video)
-                await db.flush()
-                await db.refresh(video)
-
-                # Create snapshot
-                snapshot = VideoSnapshot(
-                    video_id=video.id,
-                    play_count=video.play_count,
-                    digg_count=video.digg_count,
-                    comment_count=video.comment_count,
-                    share_count=video.share_count,
-                    collect_count=video.collect_count
-                )
-                db.add(snapshot)
         except Exception as e:
             logger.error(f"Error fetching video detail: {e}")
-            if not video:
+            video_data = None
+
+        if not video_data:
+            # Nothing to write: serve the stored row without hydrating a
+            # mutable ORM entity
+            result = await db.execute(
+                select(*(getattr(Video, f) for f in _VIDEO_FIELDS))
+                .where(Video.aweme_id == aweme_id)
+            )
+            row = result.first()
+            if not row:
                 return None
+            detail = dict(row._mapping)
+            local_cache.set(f"video_detail:{aweme_id}", detail, ttl=VIDEO_DETAIL_CACHE_TTL)
+            return detail
 
-        return {
-            "id": video.id,
-            "aweme_id": video.aweme_id,
-            "desc": video.desc,
-            "video_url": video.video_url,
-            "cover_url": video.cover_url,
-            "music_url": video.music_url,
-            "duration": video.duration,
-            "play_count": video.play_count,
-            "digg_count": video.digg_count,
-            "comment_count": video.comment_count,
-            "share_count": video.share_count,
-            "collect_count": video.collect_count,
-            "create_time": video.create_time,
-            "created_at": video.created_at,
-            "updated_at": video.updated_at
-        }
+        result = await db.execute(select(Video).where(Video.aweme_id == aweme_id))
+        video = result.scalar_one_or_none()
+        if video:
+            # Update existing video
+            for key, value in video_data.items():
+                if hasattr(video, key):
+                    setattr(video, key, value)
+        else:
+            # Create new video
+            video = Video(**video_data)
+            db.add(video)
+        # flush alone populates id and the timestamp defaults (all are
+        # Python-side), so no refresh round-trip is needed
+        await db.flush()
+
+        # Create snapshot
+        snapshot = VideoSnapshot(
+            video_id=video.id,
+            play_count=video.play_count,
+            digg_count=video.digg_count,
+            comment_count=video.comment_count,
+            share_count=video.share_count,
+            collect_count=video.collect_count
+        )
+        db.add(snapshot)
+
+        detail = dict(zip(_VIDEO_FIELDS, _video_values(video)))
+        local_cache.set(f"video_detail:{aweme_id}", detail, ttl=VIDEO_DETAIL_CACHE_TTL)
+        return detail
 
     async def get_video_comments(self, aweme_id: str, cursor: int, count: int, db: AsyncSession) -> dict:
         """Get video comments."""
@@ -97,8 +115,19 @@ class VideoService:
         from sqlalchemy import and_
 
         start_date = datetime.utcnow() - timedelta(days=days)
-        result = await db.execute(
-            select(VideoSnapshot)
+        # Column-only select: plain tuples, no ORM row instantiation per
+        # snapshot. orjson serializes the datetimes natively downstream.
+        # Streamed in driver-side batches so long histories never hold a
+        # second full copy of the result set in memory.
+        result = await db.stream(
+            select(
+                VideoSnapshot.play_count,
+                VideoSnapshot.digg_count,
+                VideoSnapshot.comment_count,
+                VideoSnapshot.share_count,
+                VideoSnapshot.collect_count,
+                VideoSnapshot.snapshot_time
+            )
             .where(
                 and_(
                     VideoSnapshot.video_id == video_id,
@@ -106,21 +135,21 @@ class VideoService:
                 )
             )
             .order_by(VideoSnapshot.snapshot_time)
+            .execution_options(yield_per=256)
         )
-        snapshots = result.scalars().all()
 
         return {
             "video_id": video_id,
             "snapshots": [
                 {
-                    "play_count": s.play_count,
-                    "digg_count": s.digg_count,
-                    "comment_count": s.comment_count,
-                    "share_count": s.share_count,
-                    "collect_count": s.collect_count,
-                    "snapshot_time": s.snapshot_time.isoformat()
+                    "play_count": plays,
+                    "digg_count": diggs,
+                    "comment_count": comments,
+                    "share_count": shares,
+                    "collect_count": collects,
+                    "snapshot_time": ts
                 }
-                for s in snapshots
+                async for plays, diggs, comments, shares, collects, ts in result
             ]
         }
 
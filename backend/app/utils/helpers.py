@@ -5,18 +5,33 @@ import re
 import time
 import random
 import string
+from bisect import bisect_right
+from functools import lru_cache
 from typing import Optional, Any, Dict
 from datetime import datetime
 
+# Patterns compiled once at import; these run on every parsed URL
+_SEC_UID_PATTERNS = (
+    re.compile(r'sec_uid=([^&]+)'),
+    re.compile(r'/user/([A-Za-z0-9_-]+)'),
+)
+_AWEME_ID_PATTERNS = (
+    re.compile(r'/video/(\d+)'),
+    re.compile(r'item_ids=(\d+)'),
+    re.compile(r'aweme_id=(\d+)'),
+)
+_ROOM_ID_PATTERNS = (
+    re.compile(r'live\.douyin\.com/(\d+)'),
+    re.compile(r'room_id=(\d+)'),
+    re.compile(r'web_rid=(\d+)'),
+)
+_INVALID_FILENAME_RE = re.compile(r'[<>:"/\\|?*]')
+
 
 def extract_sec_uid(url: str) -> Optional[str]:
     """Extract sec_uid from Douyin user URL."""
-    patterns = [
-        r'sec_uid=([^&]+)',
-        r'/user/([A-Za-z0-9_-]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
+    for pattern in _SEC_UID_PATTERNS:
+        match = pattern.search(url)
         if match:
             return match.group(1)
     return None
@@ -24,13 +39,8 @@ def extract_sec_uid(url: str) -> Optional[str]:
 
 def extract_aweme_id(url: str) -> Optional[str]:
     """Extract aweme_id from Douyin video URL."""
-    patterns = [
-        r'/video/(\d+)',
-        r'item_ids=(\d+)',
-        r'aweme_id=(\d+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
+    for pattern in _AWEME_ID_PATTERNS:
+        match = pattern.search(url)
         if match:
             return match.group(1)
     return None
@@ -38,13 +48,8 @@ def extract_aweme_id(url: str) -> Optional[str]:
 
 def extract_room_id(url: str) -> Optional[str]:
     """Extract room_id from Douyin live URL."""
-    patterns = [
-        r'live\.douyin\.com/(\d+)',
-        r'room_id=(\d+)',
-        r'web_rid=(\d+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
+    for pattern in _ROOM_ID_PATTERNS:
+        match = pattern.search(url)
         if match:
             return match.group(1)
     return None
@@ -60,16 +65,20 @@ def get_timestamp_ms() -> int:
     return int(time.time() * 1000)
 
 
+# Bucket table for format_number: one bisect call picks the divisor and
+# suffix instead of walking a branch ladder per metric
+_FMT_THRESHOLDS = (1_000, 10_000, 100_000_000)
+_FMT_DIVS = (1, 1_000, 10_000, 100_000_000)
+_FMT_SUFFIX = ("", "K", "万", "亿")
+
+
+@lru_cache(maxsize=4096)
 def format_number(num: int) -> str:
     """Format large numbers for display (e.g., 1000 -> 1K)."""
-    if num < 1000:
+    i = bisect_right(_FMT_THRESHOLDS, num)
+    if i == 0:
         return str(num)
-    elif num < 10000:
-        return f"{num / 1000:.1f}K"
-    elif num < 100000000:
-        return f"{num / 10000:.1f}万"
-    else:
-        return f"{num / 100000000:.1f}亿"
+    return f"{num / _FMT_DIVS[i]:.1f}{_FMT_SUFFIX[i]}"
 
 
 def timestamp_to_datetime(ts: int) -> datetime:
@@ -87,8 +96,7 @@ def datetime_to_timestamp(dt: datetime) -> int:
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename for safe file system usage."""
     # Remove or replace invalid characters
-    invalid_chars = r'[<>:"/\\|?*]'
-    filename = re.sub(invalid_chars, '_', filename)
+    filename = _INVALID_FILENAME_RE.sub('_', filename)
     # Limit length
     if len(filename) > 200:
         filename = filename[:200]
@@ -2,16 +2,60 @@
 Input validation utilities.
 """
 import re
-from typing import Optional
+from typing import Iterable, List, Optional, Tuple
+
+# Validators run per request on the hot API paths; compile once at import
+_SEC_UID_PREFIX = "MS4wLjABAAAA"
+_SEC_UID_TAIL_RE = re.compile(r'[A-Za-z0-9_-]{32,64}\Z')
+# str.startswith on a tuple is a single C-level scan; covers the same
+# http(s)/www variants the old regexes did
+_DOUYIN_URL_PREFIXES = (
+    "https://www.douyin.com", "http://www.douyin.com",
+    "https://douyin.com", "http://douyin.com",
+    "https://v.douyin.com", "http://v.douyin.com",
+    "https://live.douyin.com", "http://live.douyin.com",
+)
+_SEC_UID_URL_PATTERNS = (
+    re.compile(r'sec_uid=([^&]+)'),
+    re.compile(r'/user/([A-Za-z0-9_-]+)'),
+)
+_AWEME_ID_URL_PATTERNS = (
+    re.compile(r'/video/(\d+)'),
+    re.compile(r'item_ids=(\d+)'),
+    re.compile(r'aweme_id=(\d+)'),
+)
+_SEARCH_BAD_CHARS = re.compile(r'[<>"\']')
 
 
 def is_valid_sec_uid(sec_uid: str) -> bool:
     """Validate sec_uid format."""
-    if not sec_uid:
-        return False
-    # sec_uid is typically base64-like string
-    pattern = r'^MS4wLjABAAAA[A-Za-z0-9_-]{32,64}$'
-    return bool(re.match(pattern, sec_uid))
+    # Length range and fixed prefix reject most inputs before the regex
+    # ever runs; the regex only has to check the base64-like tail.
+    return bool(
+        sec_uid
+        and 44 <= len(sec_uid) <= 76
+        and sec_uid.startswith(_SEC_UID_PREFIX)
+        and _SEC_UID_TAIL_RE.match(sec_uid, len(_SEC_UID_PREFIX))
+    )
+
+
+def validate_many(sec_uids: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Split sec_uids into (valid, invalid) lists in a single pass.
+
+    Binds the prefix/regex lookups to locals so batch callers don't pay
+    a global fetch per item on top of the per-string check.
+    """
+    valid: List[str] = []
+    invalid: List[str] = []
+    prefix = _SEC_UID_PREFIX
+    plen = len(_SEC_UID_PREFIX)
+    tail_match = _SEC_UID_TAIL_RE.match
+    for s in sec_uids:
+        if s and 44 <= len(s) <= 76 and s.startswith(prefix) and tail_match(s, plen):
+            valid.append(s)
+        else:
+            invalid.append(s)
+    return valid, invalid
 
 
 def is_valid_aweme_id(aweme_id: str) -> bool:
@@ -31,17 +75,7 @@ def is_valid_room_id(room_id: str) -> bool:
 
 def is_valid_douyin_url(url: str) -> bool:
     """Validate if URL is a valid Douyin URL."""
-    if not url:
-        return False
-    patterns = [
-        r'https?://(www\.)?douyin\.com',
-        r'https?://v\.douyin\.com',
-        r'https?://live\.douyin\.com',
-    ]
-    for pattern in patterns:
-        if re.match(pattern, url):
-            return True
-    return False
+    return bool(url) and url.startswith(_DOUYIN_URL_PREFIXES)
 
 
 def extract_and_validate_sec_uid(input_str: str) -> Optional[str]:
@@ -50,12 +84,8 @@ def extract_and_validate_sec_uid(input_str: str) -> Optional[str]:
         return input_str
 
     # Try to extract from URL
-    patterns = [
-        r'sec_uid=([^&]+)',
-        r'/user/([A-Za-z0-9_-]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, input_str)
+    for pattern in _SEC_UID_URL_PATTERNS:
+        match = pattern.search(input_str)
         if match:
             sec_uid = match.group(1)
             if is_valid_sec_uid(sec_uid):
@@ -70,13 +100,8 @@ def extract_and_validate_aweme_id(input_str: str) -> Optional[str]:
         return input_str
 
     # Try to extract from URL
-    patterns = [
-        r'/video/(\d+)',
-        r'item_ids=(\d+)',
-        r'aweme_id=(\d+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, input_str)
+    for pattern in _AWEME_ID_URL_PATTERNS:
+        match = pattern.search(input_str)
         if match:
             return match.group(1)
 
@@ -88,6 +113,6 @@ def sanitize_search_keyword(keyword: str) -> str:
     if not keyword:
         return ""
     # Remove potentially harmful characters
-    keyword = re.sub(r'[<>"\']', '', keyword)
+    keyword = _SEARCH_BAD_CHARS.sub('', keyword)
     # Limit length
     return keyword[:100].strip()
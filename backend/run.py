@@ -24,6 +24,9 @@ def main():
         port=settings.port,
         reload=settings.debug,
         log_level=settings.log_level.lower(),
+        # libuv event loop + C HTTP parser instead of selector loop + h11
+        loop="uvloop",
+        http="httptools",
     )
 
 
@@ -594,7 +594,7 @@ const Settings = () => {
                 boxShadow: '0 2px 8px rgba(0,0,0,0.1)'
               }}>
                 <img
-                  src={`data:image/png;base64,${qrImage}`}
+                  src={qrImage}
                   alt="QR Code"
                   style={{ width: 200, height: 200 }}
                 />
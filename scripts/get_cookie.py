@@ -19,12 +19,18 @@
 """
 
 import asyncio
+import os
 import sys
 from typing import Optional, Dict, Any
 
 # 检查 Playwright 是否安装
 try:
-    from playwright.async_api import async_playwright, Page, BrowserContext
+    from playwright.async_api import (
+        async_playwright,
+        Page,
+        BrowserContext,
+        TimeoutError as PlaywrightTimeoutError,
+    )
 except ImportError:
     print("=" * 60)
     print("错误: 未安装 Playwright")
@@ -43,181 +49,260 @@ DOUYIN_LOGIN_URL = "https://www.douyin.com/"
 QR_CODE_SELECTOR = "xpath=//div[@id='animate_qrcode_container']//img"
 
 # 必要的 Cookie
-ESSENTIAL_COOKIES = ["sessionid", "sessionid_ss", "ttwid", "LOGIN_STATUS"]
-
-
-async def check_login_status(page: Page, context: BrowserContext) -> bool:
-    """
-    检查是否已登录
-
-    使用 MediaCrawler 的检测逻辑:
-    1. 检查 localStorage.HasUserLogin == "1"
-    2. 检查 LOGIN_STATUS cookie == "1"
-    """
-    try:
-        # 方法 1: 检查 localStorage
-        local_storage = await page.evaluate("() => window.localStorage")
-        if local_storage and local_storage.get("HasUserLogin") == "1":
-            return True
-
-        # 方法 2: 检查 Cookie
-        cookies = await context.cookies()
-        cookie_dict = {c["name"]: c["value"] for c in cookies}
-
-        if cookie_dict.get("LOGIN_STATUS") == "1":
-            return True
-
-        if cookie_dict.get("sessionid"):
-            return True
-
-        return False
-
-    except Exception as e:
-        print(f"检查登录状态时出错: {e}")
-        return False
+ESSENTIAL_COOKIES = frozenset({"sessionid", "sessionid_ss", "ttwid", "LOGIN_STATUS"})
+
+# 持久化的浏览器用户目录: 登录态跨运行保留,
+# 二次运行时 Cookie 仍然有效就无需再次扫码
+USER_DATA_DIR = os.path.expanduser("~/.douyin_cookie_profile")
+
+# 浏览器启动参数与指纹配置: 模块级常量, 各次运行共用
+UA_STRING = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+    " (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+BROWSER_ARGS = (
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-blink-features=AutomationControlled',
+)
+VIEWPORT = {"width": 1280, "height": 800}
+# 反检测脚本: 预先压成单行, 每次创建上下文时跨 CDP 的字节更少,
+# webdriver/plugins/languages 三个属性一次注入完成
+STEALTH_SCRIPT = (
+    "Object.defineProperty(navigator,'webdriver',{get:()=>void 0});"
+    "Object.defineProperty(navigator,'plugins',{get:()=>[1,2,3]});"
+    "Object.defineProperty(navigator,'languages',{get:()=>['zh-CN','zh']});"
+)
+
+# 登录按钮和扫码入口在浏览器内一次性查找并点击,
+# 把 查找+点击 x2 的四次 CDP 往返合并为一次
+CLICK_LOGIN_FLOW_JS = (
+    "() => {"
+    " const btn = [...document.querySelectorAll('button,div')]"
+    ".find(e => e.textContent.trim() === '登录' && !e.children.length);"
+    " if (btn) btn.click();"
+    " const tab = [...document.querySelectorAll('div,span')]"
+    ".find(e => e.textContent.includes('扫码登录'));"
+    " if (tab) tab.click();"
+    " return {btn: !!btn, tab: !!tab};"
+    "}"
+)
+CLICK_QR_TAB_JS = (
+    "() => {"
+    " const tab = [...document.querySelectorAll('div,span')]"
+    ".find(e => e.textContent.includes('扫码登录'));"
+    " if (tab) tab.click();"
+    " return !!tab;"
+    "}"
+)
+
+# 与扫码无关的重资源类型; 样式保留, 否则用户看到的页面一片混乱
+BLOCKED_RESOURCE_TYPES = ("font", "media")
+
+# 批量输出: 整段文案先攒在列表里, flush 时一次 write 写出,
+# 避免逐行刷新的系统调用, 也不会和 Playwright 的 stderr 交错
+_BUF = []
+
+
+def log(*msgs) -> None:
+    """缓冲一行输出, 由 flush() 统一写出"""
+    _BUF.append(" ".join(map(str, msgs)))
+
+
+def flush() -> None:
+    """把缓冲的输出一次性写到 stdout"""
+    if _BUF:
+        sys.stdout.write("\n".join(_BUF) + "\n")
+        _BUF.clear()
+    sys.stdout.flush()
+
+
+async def _abort_heavy_resources(route):
+    """拦截字体/音视频和与二维码无关的图片, 缩短到码时间"""
+    rtype = route.request.resource_type
+    if rtype in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    elif rtype == "image" and "qr" not in route.request.url.lower():
+        await route.abort()
+    else:
+        await route.continue_()
+
+# 登录完成的页内检测条件 (来自 MediaCrawler 的检测逻辑):
+# localStorage.HasUserLogin == "1"、LOGIN_STATUS cookie == "1"
+# 或已有 sessionid cookie
+LOGIN_DONE_JS = (
+    "() => (window.localStorage && window.localStorage.getItem('HasUserLogin') === '1')"
+    " || document.cookie.includes('LOGIN_STATUS=1')"
+    " || document.cookie.includes('sessionid=')"
+)
+
+
+async def print_cookie(context: BrowserContext) -> None:
+    """输出 Cookie 字符串并提示缺失的必要项"""
+    # 只拉取一次 Cookie, 拼接和校验共用同一份列表
+    cookies = await context.cookies()
+    cookie_string = "; ".join(f"{c['name']}={c['value']}" for c in cookies)
+    have = {c["name"] for c in cookies if c["value"]}
+    missing = sorted(ESSENTIAL_COOKIES - have)
 
+    if missing:
+        log(f"警告: 缺少部分 Cookie: {missing}")
+        log("Cookie 可能不完整，但仍可尝试使用")
+        log("")
 
-async def get_cookie_string(context: BrowserContext) -> str:
-    """获取格式化的 Cookie 字符串"""
-    cookies = await context.cookies()
-    return "; ".join([f"{c['name']}={c['value']}" for c in cookies])
+    log("请复制以下 Cookie 字符串:")
+    log("")
+    log("-" * 60)
+    log(cookie_string)
+    log("-" * 60)
+    log("")
+    log("然后粘贴到抖音数据平台的设置页面中")
+    flush()
 
 
 async def wait_for_login(page: Page, context: BrowserContext, timeout: int = 300) -> bool:
-    """等待用户扫码登录"""
-    print("\n等待扫码登录...")
-    print("(超时时间: {} 秒)".format(timeout))
+    """等待用户扫码登录
 
-    for i in range(timeout):
-        if await check_login_status(page, context):
-            return True
-        await asyncio.sleep(1)
-        if i % 10 == 0 and i > 0:
-            print(f"已等待 {i} 秒...")
+    浏览器端的 wait_for_function 在条件满足时立即返回,
+    等待期间脚本和浏览器都不消耗 CPU, 不再每秒轮询。
+    """
+    log("\n等待扫码登录...")
+    log("(超时时间: {} 秒)".format(timeout))
+    flush()
 
-    return False
+    try:
+        await page.wait_for_function(LOGIN_DONE_JS, timeout=timeout * 1000)
+        return True
+    except PlaywrightTimeoutError:
+        # 兜底: sessionid 可能是 HttpOnly, document.cookie 看不到;
+        # 超时后用 context.cookies() 再直接确认一次
+        for c in await context.cookies():
+            name = c["name"]
+            if (name == "LOGIN_STATUS" and c["value"] == "1") or (
+                name == "sessionid" and c["value"]
+            ):
+                return True
+        return False
 
 
 async def main():
     """主函数"""
-    print("=" * 60)
-    print("抖音 Cookie 获取工具")
-    print("=" * 60)
-    print("")
-    print("此脚本将打开浏览器窗口，请按以下步骤操作:")
-    print("1. 等待浏览器打开抖音页面")
-    print("2. 使用抖音 App 扫描二维码")
-    print("3. 在手机上确认登录")
-    print("4. 登录成功后会自动输出 Cookie")
-    print("")
-    print("正在启动浏览器...")
+    log("=" * 60)
+    log("抖音 Cookie 获取工具")
+    log("=" * 60)
+    log("")
+    log("此脚本将打开浏览器窗口，请按以下步骤操作:")
+    log("1. 等待浏览器打开抖音页面")
+    log("2. 使用抖音 App 扫描二维码")
+    log("3. 在手机上确认登录")
+    log("4. 登录成功后会自动输出 Cookie")
+    log("")
+    log("正在启动浏览器...")
+    flush()
 
     async with async_playwright() as p:
-        # 启动浏览器 (非 headless 模式，用户可以看到页面)
-        browser = await p.chromium.launch(
+        # 持久化上下文 (非 headless 模式，用户可以看到页面);
+        # 登录态保存在 USER_DATA_DIR, 下次运行免扫码
+        context = await p.chromium.launch_persistent_context(
+            user_data_dir=USER_DATA_DIR,
             headless=False,
-            args=[
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-blink-features=AutomationControlled',
-            ]
-        )
-
-        # 创建浏览器上下文
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            viewport={"width": 1280, "height": 800}
+            args=list(BROWSER_ARGS),
+            user_agent=UA_STRING,
+            viewport=VIEWPORT
         )
 
         # 防止检测自动化
-        await context.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined
-            });
-        """)
+        await context.add_init_script(STEALTH_SCRIPT)
 
-        # 创建页面
-        page = await context.new_page()
+        # 拦截重资源, 页面只拉登录流程真正需要的内容
+        await context.route("**/*", _abort_heavy_resources)
+
+        # 持久化上下文自带一个初始页面
+        page = context.pages[0] if context.pages else await context.new_page()
 
         try:
-            # 导航到抖音
+            # 导航到抖音; douyin.com 的统计长连接会让 networkidle 迟迟
+            # 不触发, DOM 就绪后二维码即可渲染, 无需等网络安静
             print("正在打开抖音...")
-            await page.goto(DOUYIN_LOGIN_URL, wait_until="networkidle", timeout=60000)
-
-            # 等待页面加载
-            await asyncio.sleep(2)
+            await page.goto(DOUYIN_LOGIN_URL, wait_until="domcontentloaded", timeout=60000)
+
+            # 上次运行留下的登录态仍然有效时直接导出, 无需扫码
+            if await page.evaluate(LOGIN_DONE_JS):
+                log("")
+                log("=" * 60)
+                log("检测到已有登录态，直接导出 Cookie")
+                log("=" * 60)
+                log("")
+                await print_cookie(context)
+                print("")
+                input("按 Enter 键关闭浏览器...")
+                return
 
-            # 尝试点击登录按钮
+            # 登录弹窗通常会自动出现; 先直接等二维码节点挂载,
+            # 等不到再走下面的点击流程
             try:
-                login_btn = await page.query_selector("button:has-text('登录'), div:has-text('登录'):not(:has(*))")
-                if login_btn:
-                    await login_btn.click()
-                    await asyncio.sleep(1)
-            except:
+                await page.wait_for_selector(QR_CODE_SELECTOR, timeout=10000, state="attached")
+            except PlaywrightTimeoutError:
                 pass
 
-            # 尝试切换到扫码登录
+            # 一次 evaluate 点击登录按钮和扫码入口;
+            # 弹窗是点击后才渲染的话, 等入口出现后再补点一次
             try:
-                qr_tab = await page.query_selector("div:has-text('扫码登录'), span:has-text('扫码登录')")
-                if qr_tab:
-                    await qr_tab.click()
-                    await asyncio.sleep(1)
+                clicked = await page.evaluate(CLICK_LOGIN_FLOW_JS)
+                if clicked["btn"] and not clicked["tab"]:
+                    await page.wait_for_selector(
+                        "div:has-text('扫码登录'), span:has-text('扫码登录')",
+                        timeout=5000
+                    )
+                    await page.evaluate(CLICK_QR_TAB_JS)
+                await page.wait_for_selector(QR_CODE_SELECTOR, timeout=10000)
             except:
                 pass
 
-            print("")
-            print("=" * 60)
-            print("请在浏览器窗口中找到二维码并用抖音 App 扫描")
-            print("=" * 60)
-            print("")
+            log("")
+            log("=" * 60)
+            log("请在浏览器窗口中找到二维码并用抖音 App 扫描")
+            log("=" * 60)
+            log("")
+            flush()
 
             # 等待用户登录
             if await wait_for_login(page, context):
-                # 获取 Cookie
-                cookie_string = await get_cookie_string(context)
+                log("")
+                log("=" * 60)
+                log("登录成功!")
+                log("=" * 60)
+                log("")
 
-                # 验证必要的 Cookie
-                cookies = await context.cookies()
-                cookie_dict = {c["name"]: c["value"] for c in cookies}
-                missing = [c for c in ESSENTIAL_COOKIES if c not in cookie_dict or not cookie_dict[c]]
-
-                print("")
-                print("=" * 60)
-                print("登录成功!")
-                print("=" * 60)
-                print("")
-
-                if missing:
-                    print(f"警告: 缺少部分 Cookie: {missing}")
-                    print("Cookie 可能不完整，但仍可尝试使用")
-                    print("")
-
-                print("请复制以下 Cookie 字符串:")
-                print("")
-                print("-" * 60)
-                print(cookie_string)
-                print("-" * 60)
-                print("")
-                print("然后粘贴到抖音数据平台的设置页面中")
+                await print_cookie(context)
 
                 # 等待用户复制
                 print("")
                 input("按 Enter 键关闭浏览器...")
 
             else:
-                print("")
-                print("=" * 60)
-                print("登录超时，请重新运行脚本")
-                print("=" * 60)
+                log("")
+                log("=" * 60)
+                log("登录超时，请重新运行脚本")
+                log("=" * 60)
+                flush()
 
         except Exception as e:
             print(f"发生错误: {e}")
 
         finally:
-            await browser.close()
+            await context.close()
 
 
 if __name__ == "__main__":
+    # uvloop 可选: POSIX 上的 libuv 事件循环, CDP 往返的 socket I/O
+    # 更快; Windows 或未安装时用默认循环
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -19,12 +19,18 @@
 
 import argparse
 import asyncio
+import os
 import sys
 from typing import Optional
 
 # 检查依赖
 try:
-    from playwright.async_api import async_playwright, Page, BrowserContext
+    from playwright.async_api import (
+        async_playwright,
+        Page,
+        BrowserContext,
+        TimeoutError as PlaywrightTimeoutError,
+    )
 except ImportError:
     print("=" * 60)
     print("错误: 未安装 Playwright")
@@ -45,6 +51,15 @@ except ImportError:
     print("=" * 60)
     sys.exit(1)
 
+# orjson 可选: C 实现的 JSON 解析, 比 stdlib 快数倍;
+# 未安装时无缝回退到标准库
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    import json
+    _loads = json.loads
+
 
 # 抖音登录 URL
 DOUYIN_LOGIN_URL = "https://www.douyin.com/"
@@ -53,7 +68,92 @@ DOUYIN_LOGIN_URL = "https://www.douyin.com/"
 QR_CODE_SELECTOR = "xpath=//div[@id='animate_qrcode_container']//img"
 
 # 必要的 Cookie
-ESSENTIAL_COOKIES = ["sessionid", "sessionid_ss", "ttwid", "LOGIN_STATUS"]
+ESSENTIAL_COOKIES = frozenset({"sessionid", "sessionid_ss", "ttwid", "LOGIN_STATUS"})
+
+# 持久化的浏览器用户目录: 与 get_cookie.py 共用, 登录态跨运行保留,
+# Cookie 仍有效时重跑无需再次扫码
+USER_DATA_DIR = os.path.expanduser("~/.douyin_cookie_profile")
+
+# 登录完成的页内检测条件 (来自 MediaCrawler 的检测逻辑):
+# localStorage.HasUserLogin == "1"、LOGIN_STATUS cookie == "1"
+# 或已有 sessionid cookie
+LOGIN_DONE_JS = (
+    "() => (window.localStorage && window.localStorage.getItem('HasUserLogin') === '1')"
+    " || document.cookie.includes('LOGIN_STATUS=1')"
+    " || document.cookie.includes('sessionid=')"
+)
+
+# 浏览器启动参数与指纹配置: 模块级常量, 各次运行共用
+UA_STRING = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+    " (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+BROWSER_ARGS = (
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-blink-features=AutomationControlled',
+)
+VIEWPORT = {"width": 1280, "height": 800}
+# 反检测脚本: 预先压成单行, 每次创建上下文时跨 CDP 的字节更少,
+# webdriver/plugins/languages 三个属性一次注入完成
+STEALTH_SCRIPT = (
+    "Object.defineProperty(navigator,'webdriver',{get:()=>void 0});"
+    "Object.defineProperty(navigator,'plugins',{get:()=>[1,2,3]});"
+    "Object.defineProperty(navigator,'languages',{get:()=>['zh-CN','zh']});"
+)
+
+# 登录按钮和扫码入口在浏览器内一次性查找并点击,
+# 把 查找+点击 x2 的四次 CDP 往返合并为一次
+CLICK_LOGIN_FLOW_JS = (
+    "() => {"
+    " const btn = [...document.querySelectorAll('button,div')]"
+    ".find(e => e.textContent.trim() === '登录' && !e.children.length);"
+    " if (btn) btn.click();"
+    " const tab = [...document.querySelectorAll('div,span')]"
+    ".find(e => e.textContent.includes('扫码登录'));"
+    " if (tab) tab.click();"
+    " return {btn: !!btn, tab: !!tab};"
+    "}"
+)
+CLICK_QR_TAB_JS = (
+    "() => {"
+    " const tab = [...document.querySelectorAll('div,span')]"
+    ".find(e => e.textContent.includes('扫码登录'));"
+    " if (tab) tab.click();"
+    " return !!tab;"
+    "}"
+)
+
+# 与扫码无关的重资源类型; 样式保留, 否则用户看到的页面一片混乱
+BLOCKED_RESOURCE_TYPES = ("font", "media")
+
+# 批量输出: 整段文案先攒在列表里, flush 时一次 write 写出,
+# 避免逐行刷新的系统调用, 也不会和 Playwright 的 stderr 交错
+_BUF = []
+
+
+def log(*msgs) -> None:
+    """缓冲一行输出, 由 flush() 统一写出"""
+    _BUF.append(" ".join(map(str, msgs)))
+
+
+def flush() -> None:
+    """把缓冲的输出一次性写到 stdout"""
+    if _BUF:
+        sys.stdout.write("\n".join(_BUF) + "\n")
+        _BUF.clear()
+    sys.stdout.flush()
+
+
+async def _abort_heavy_resources(route):
+    """拦截字体/音视频和与二维码无关的图片, 缩短到码时间"""
+    rtype = route.request.resource_type
+    if rtype in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    elif rtype == "image" and "qr" not in route.request.url.lower():
+        await route.abort()
+    else:
+        await route.continue_()
 
 
 async def check_login_status(page: Page, context: BrowserContext) -> bool:
@@ -65,21 +165,26 @@ async def check_login_status(page: Page, context: BrowserContext) -> bool:
     2. 检查 LOGIN_STATUS cookie == "1"
     """
     try:
-        # 方法 1: 检查 localStorage
-        local_storage = await page.evaluate("() => window.localStorage")
-        if local_storage and local_storage.get("HasUserLogin") == "1":
-            return True
-
-        # 方法 2: 检查 Cookie
-        cookies = await context.cookies()
-        cookie_dict = {c["name"]: c["value"] for c in cookies}
-
-        if cookie_dict.get("LOGIN_STATUS") == "1":
+        # localStorage 标志和 document.cookie 在同一次 evaluate 中取回,
+        # 一次 CDP 往返覆盖两种检测
+        data = await page.evaluate(
+            "() => ({h: (window.localStorage && localStorage.getItem('HasUserLogin')) || '',"
+            " c: document.cookie})"
+        )
+        if data["h"] == "1":
             return True
-
-        if cookie_dict.get("sessionid"):
+        if "LOGIN_STATUS=1" in data["c"] or "sessionid=" in data["c"]:
             return True
 
+        # sessionid 通常是 HttpOnly, document.cookie 看不到;
+        # 仅在上面都未命中时才额外查一次完整 Cookie。
+        # 单次遍历即短路返回, 不构造中间 dict
+        for c in await context.cookies():
+            name = c["name"]
+            if (name == "LOGIN_STATUS" and c["value"] == "1") or (
+                name == "sessionid" and c["value"]
+            ):
+                return True
         return False
 
     except Exception as e:
@@ -87,223 +192,258 @@ async def check_login_status(page: Page, context: BrowserContext) -> bool:
         return False
 
 
-async def get_cookie_string(context: BrowserContext) -> str:
-    """获取格式化的 Cookie 字符串"""
-    cookies = await context.cookies()
-    return "; ".join([f"{c['name']}={c['value']}" for c in cookies])
+async def wait_for_login(page: Page, context: BrowserContext, timeout: int = 300) -> bool:
+    """等待用户扫码登录
 
+    浏览器端的 wait_for_function 在条件满足时立即返回,
+    等待期间脚本和浏览器都不消耗 CPU, 不再每秒轮询。
+    """
+    log("\n等待扫码登录...")
+    log("(超时时间: {} 秒)".format(timeout))
+    flush()
 
-async def wait_for_login(page: Page, context: BrowserContext, timeout: int = 300) -> bool:
-    """等待用户扫码登录"""
-    print("\n等待扫码登录...")
-    print("(超时时间: {} 秒)".format(timeout))
+    try:
+        await page.wait_for_function(LOGIN_DONE_JS, timeout=timeout * 1000)
+        return True
+    except PlaywrightTimeoutError:
+        # 兜底: 超时后再做一次直接检查 (sessionid 可能是 HttpOnly,
+        # document.cookie 看不到时 context.cookies() 仍能发现)
+        return await check_login_status(page, context)
 
-    for i in range(timeout):
-        if await check_login_status(page, context):
-            return True
-        await asyncio.sleep(1)
-        if i % 10 == 0 and i > 0:
-            print(f"已等待 {i} 秒...")
 
-    return False
+# 复用的 HTTP 客户端: 连接探测和 Cookie 上传共用同一个连接池,
+# 第二个请求不再重新做 TCP/TLS 握手
+http_client = httpx.AsyncClient(
+    timeout=30.0,
+    limits=httpx.Limits(max_keepalive_connections=5, max_connections=10),
+)
 
 
 async def upload_cookie(server_url: str, cookie_string: str) -> dict:
     """上传 Cookie 到远程服务器"""
     api_url = f"{server_url.rstrip('/')}/api/auth/cookie/save"
 
-    print(f"\n正在上传 Cookie 到服务器...")
-    print(f"API 地址: {api_url}")
+    log(f"\n正在上传 Cookie 到服务器...")
+    log(f"API 地址: {api_url}")
+    flush()
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            response = await client.post(
-                api_url,
-                json={"cookie": cookie_string},
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            return {"success": False, "message": f"HTTP 错误: {e.response.status_code}"}
-        except httpx.RequestError as e:
-            return {"success": False, "message": f"请求错误: {str(e)}"}
-        except Exception as e:
-            return {"success": False, "message": f"未知错误: {str(e)}"}
+    try:
+        response = await http_client.post(
+            api_url,
+            json={"cookie": cookie_string},
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        return _loads(response.content)
+    except httpx.HTTPStatusError as e:
+        return {"success": False, "message": f"HTTP 错误: {e.response.status_code}"}
+    except httpx.RequestError as e:
+        return {"success": False, "message": f"请求错误: {str(e)}"}
+    except Exception as e:
+        return {"success": False, "message": f"未知错误: {str(e)}"}
 
 
 async def check_server_status(server_url: str) -> bool:
-    """检查服务器是否可达"""
+    """检查服务器是否可达
+
+    只关心可达性: HEAD 不传响应体, 2 秒超时让"连不上"尽快暴露;
+    405 (不支持 HEAD) 也说明服务器在线。
+    """
     api_url = f"{server_url.rstrip('/')}/api/auth/cookie/status"
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            response = await client.get(api_url)
-            response.raise_for_status()
-            return True
-        except Exception:
-            return False
+    try:
+        response = await http_client.head(api_url, timeout=2.0)
+        return response.status_code < 500
+    except Exception:
+        return False
 
 
 async def main(server_url: Optional[str] = None, no_upload: bool = False):
-    """主函数"""
-    print("=" * 60)
-    print("抖音 Cookie 获取工具 - 自动上传版")
-    print("=" * 60)
-    print("")
+    """主函数: 确保共享 HTTP 客户端在退出时关闭"""
+    try:
+        await _run(server_url, no_upload)
+    finally:
+        await http_client.aclose()
+
+
+async def _run(server_url: Optional[str] = None, no_upload: bool = False):
+    """获取并上传 Cookie 的主流程"""
+    log("=" * 60)
+    log("抖音 Cookie 获取工具 - 自动上传版")
+    log("=" * 60)
+    log("")
 
-    # 检查服务器连接
+    # 后台发起服务器探测, 与浏览器启动并行, 结果在启动完成后再取
+    status_task = None
     if server_url and not no_upload:
-        print(f"目标服务器: {server_url}")
-        print("正在检查服务器连接...")
-
-        if await check_server_status(server_url):
-            print("服务器连接正常")
-        else:
-            print("警告: 无法连接到服务器，Cookie 获取后将仅在本地显示")
-            print("请检查服务器地址是否正确")
-            no_upload = True
-        print("")
+        log(f"目标服务器: {server_url}")
+        log("正在检查服务器连接...")
+        status_task = asyncio.create_task(check_server_status(server_url))
     elif not no_upload:
-        print("未指定服务器地址，Cookie 将仅在本地显示")
-        print("使用 --server 参数指定服务器地址以启用自动上传")
-        print("")
+        log("未指定服务器地址，Cookie 将仅在本地显示")
+        log("使用 --server 参数指定服务器地址以启用自动上传")
+        log("")
         no_upload = True
 
-    print("此脚本将打开浏览器窗口，请按以下步骤操作:")
-    print("1. 等待浏览器打开抖音页面")
-    print("2. 使用抖音 App 扫描二维码")
-    print("3. 在手机上确认登录")
+    log("此脚本将打开浏览器窗口，请按以下步骤操作:")
+    log("1. 等待浏览器打开抖音页面")
+    log("2. 使用抖音 App 扫描二维码")
+    log("3. 在手机上确认登录")
     if not no_upload:
-        print("4. 登录成功后会自动上传 Cookie 到服务器")
+        log("4. 登录成功后会自动上传 Cookie 到服务器")
     else:
-        print("4. 登录成功后会输出 Cookie")
-    print("")
-    print("正在启动浏览器...")
+        log("4. 登录成功后会输出 Cookie")
+    log("")
+    log("正在启动浏览器...")
+    flush()
 
     async with async_playwright() as p:
-        # 启动浏览器 (非 headless 模式，用户可以看到页面)
-        browser = await p.chromium.launch(
+        # 持久化上下文 (非 headless 模式，用户可以看到页面);
+        # 登录态保存在 USER_DATA_DIR, 下次运行免扫码
+        context = await p.chromium.launch_persistent_context(
+            user_data_dir=USER_DATA_DIR,
             headless=False,
-            args=[
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-blink-features=AutomationControlled',
-            ]
-        )
-
-        # 创建浏览器上下文
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            viewport={"width": 1280, "height": 800}
+            args=list(BROWSER_ARGS),
+            user_agent=UA_STRING,
+            viewport=VIEWPORT
         )
 
         # 防止检测自动化
-        await context.add_init_script("""
-            Object.defineProperty(navigator, 'webdriver', {
-                get: () => undefined
-            });
-        """)
+        await context.add_init_script(STEALTH_SCRIPT)
+
+        # 拦截重资源, 页面只拉登录流程真正需要的内容
+        await context.route("**/*", _abort_heavy_resources)
+
+        # 持久化上下文自带一个初始页面
+        page = context.pages[0] if context.pages else await context.new_page()
 
-        # 创建页面
-        page = await context.new_page()
+        # Chromium 启动期间探测已在后台进行, 此时直接取结果
+        if status_task is not None:
+            if await status_task:
+                log("服务器连接正常")
+            else:
+                log("警告: 无法连接到服务器，Cookie 获取后将仅在本地显示")
+                log("请检查服务器地址是否正确")
+                no_upload = True
+            log("")
+            flush()
 
         try:
-            # 导航到抖音
+            # 导航到抖音; douyin.com 的统计长连接会让 networkidle 迟迟
+            # 不触发, DOM 就绪后二维码即可渲染, 无需等网络安静
             print("正在打开抖音...")
-            await page.goto(DOUYIN_LOGIN_URL, wait_until="networkidle", timeout=60000)
-
-            # 等待页面加载
-            await asyncio.sleep(2)
-
-            # 尝试点击登录按钮
-            try:
-                login_btn = await page.query_selector("button:has-text('登录'), div:has-text('登录'):not(:has(*))")
-                if login_btn:
-                    await login_btn.click()
-                    await asyncio.sleep(1)
-            except:
-                pass
-
-            # 尝试切换到扫码登录
-            try:
-                qr_tab = await page.query_selector("div:has-text('扫码登录'), span:has-text('扫码登录')")
-                if qr_tab:
-                    await qr_tab.click()
-                    await asyncio.sleep(1)
-            except:
-                pass
-
-            print("")
-            print("=" * 60)
-            print("请在浏览器窗口中找到二维码并用抖音 App 扫描")
-            print("=" * 60)
-            print("")
-
-            # 等待用户登录
-            if await wait_for_login(page, context):
-                # 获取 Cookie
-                cookie_string = await get_cookie_string(context)
-
-                # 验证必要的 Cookie
+            await page.goto(DOUYIN_LOGIN_URL, wait_until="domcontentloaded", timeout=60000)
+
+            # 上次运行留下的登录态仍然有效时直接导出, 无需扫码
+            warm_start = logged_in = await check_login_status(page, context)
+            if logged_in:
+                log("")
+                log("=" * 60)
+                log("检测到已有登录态，直接导出 Cookie")
+                log("=" * 60)
+                flush()
+            else:
+                # 登录弹窗通常会自动出现; 先直接等二维码节点挂载,
+                # 等不到再走下面的点击流程
+                try:
+                    await page.wait_for_selector(QR_CODE_SELECTOR, timeout=10000, state="attached")
+                except PlaywrightTimeoutError:
+                    pass
+
+                # 一次 evaluate 点击登录按钮和扫码入口;
+                # 弹窗是点击后才渲染的话, 等入口出现后再补点一次
+                try:
+                    clicked = await page.evaluate(CLICK_LOGIN_FLOW_JS)
+                    if clicked["btn"] and not clicked["tab"]:
+                        await page.wait_for_selector(
+                            "div:has-text('扫码登录'), span:has-text('扫码登录')",
+                            timeout=5000
+                        )
+                        await page.evaluate(CLICK_QR_TAB_JS)
+                    await page.wait_for_selector(QR_CODE_SELECTOR, timeout=10000)
+                except:
+                    pass
+
+                log("")
+                log("=" * 60)
+                log("请在浏览器窗口中找到二维码并用抖音 App 扫描")
+                log("=" * 60)
+                log("")
+                flush()
+
+                # 等待用户登录
+                logged_in = await wait_for_login(page, context)
+
+            if logged_in:
+                # 只拉取一次 Cookie, 拼接和校验共用同一份列表
                 cookies = await context.cookies()
-                cookie_dict = {c["name"]: c["value"] for c in cookies}
-                missing = [c for c in ESSENTIAL_COOKIES if c not in cookie_dict or not cookie_dict[c]]
+                cookie_string = "; ".join(f"{c['name']}={c['value']}" for c in cookies)
+                have = {c["name"] for c in cookies if c["value"]}
+                missing = sorted(ESSENTIAL_COOKIES - have)
 
-                print("")
-                print("=" * 60)
-                print("登录成功!")
-                print("=" * 60)
-                print("")
+                log("")
+                if not warm_start:
+                    log("=" * 60)
+                    log("登录成功!")
+                    log("=" * 60)
+                    log("")
 
                 if missing:
-                    print(f"警告: 缺少部分 Cookie: {missing}")
-                    print("Cookie 可能不完整，但仍可尝试使用")
-                    print("")
+                    log(f"警告: 缺少部分 Cookie: {missing}")
+                    log("Cookie 可能不完整，但仍可尝试使用")
+                    log("")
+                flush()
 
-                # 上传或显示 Cookie
+                # 上传或显示 Cookie; 核心 Cookie 缺失时服务端必然拒绝,
+                # 直接走本地显示, 省掉一次注定失败的上传等待
                 if not no_upload and server_url:
-                    result = await upload_cookie(server_url, cookie_string)
+                    if "sessionid" in missing or "ttwid" in missing:
+                        print("核心 Cookie 缺失，跳过上传")
+                        result = {"success": False, "message": "核心 Cookie 缺失"}
+                    else:
+                        result = await upload_cookie(server_url, cookie_string)
 
-                    print("")
+                    log("")
                     if result.get("success"):
-                        print("=" * 60)
-                        print("Cookie 已成功上传到服务器!")
-                        print("=" * 60)
-                        print("")
-                        print("您现在可以关闭此窗口，并在平台上使用数据采集功能")
+                        log("=" * 60)
+                        log("Cookie 已成功上传到服务器!")
+                        log("=" * 60)
+                        log("")
+                        log("您现在可以关闭此窗口，并在平台上使用数据采集功能")
                     else:
-                        print("=" * 60)
-                        print(f"上传失败: {result.get('message', '未知错误')}")
-                        print("=" * 60)
-                        print("")
-                        print("Cookie 字符串 (可手动复制):")
-                        print("-" * 60)
-                        print(cookie_string)
-                        print("-" * 60)
+                        log("=" * 60)
+                        log(f"上传失败: {result.get('message', '未知错误')}")
+                        log("=" * 60)
+                        log("")
+                        log("Cookie 字符串 (可手动复制):")
+                        log("-" * 60)
+                        log(cookie_string)
+                        log("-" * 60)
                 else:
-                    print("Cookie 字符串:")
-                    print("-" * 60)
-                    print(cookie_string)
-                    print("-" * 60)
-                    print("")
-                    print("请复制上述 Cookie 并粘贴到抖音数据平台的设置页面中")
+                    log("Cookie 字符串:")
+                    log("-" * 60)
+                    log(cookie_string)
+                    log("-" * 60)
+                    log("")
+                    log("请复制上述 Cookie 并粘贴到抖音数据平台的设置页面中")
 
                 # 等待用户确认
-                print("")
+                log("")
+                flush()
                 input("按 Enter 键关闭浏览器...")
 
             else:
-                print("")
-                print("=" * 60)
-                print("登录超时，请重新运行脚本")
-                print("=" * 60)
+                log("")
+                log("=" * 60)
+                log("登录超时，请重新运行脚本")
+                log("=" * 60)
+                flush()
 
         except Exception as e:
             print(f"发生错误: {e}")
 
         finally:
-            await browser.close()
+            await context.close()
 
 
 def parse_args():
@@ -340,6 +480,14 @@ def parse_args():
 
 
 if __name__ == "__main__":
+    # uvloop 可选: POSIX 上的 libuv 事件循环, CDP 往返和 HTTP 调用的
+    # socket I/O 更快; Windows 或未安装时用默认循环
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
     try:
         args = parse_args()
         asyncio.run(main(server_url=args.server, no_upload=args.no_upload))